@@ -1,6 +1,9 @@
 from presidio_analyzer import AnalyzerEngine, RecognizerRegistry, PatternRecognizer, Pattern
 from presidio_analyzer.nlp_engine import NlpEngineProvider
 from .recognizers import FrenchLicensePlateRecognizer, FrenchInsuranceRecognizer
+from .filters import DetectionFilter
+from .pattern_scanner import PatternScanner
+from .metrics import metrics
 import yaml
 import os
 import re
@@ -66,15 +69,11 @@ class FrenchAnalyzer:
         else:
             logger.debug(f"No custom recognizers file: {custom_recognizers_path}")
 
-        self.global_allow_list = self.GLOBAL_ALLOW_LIST.copy()
-        self.doc_specific_allow_lists = self.DOC_SPECIFIC_ALLOW_LISTS.copy()
-        logger.info(f"Allow lists initialized: {len(self.global_allow_list)} global items")
+        # Only French recognizers run during analysis: scan their regexes together, once per text
+        self.pattern_scanner = PatternScanner.install(registry.get_recognizers(language="fr", all_fields=True))
 
-        if allow_lists_path and os.path.exists(allow_lists_path):
-            logger.info(f"Loading custom allow lists from: {allow_lists_path}")
-            self._load_allow_lists(allow_lists_path)
-        else:
-            logger.debug(f"No custom allow lists file: {allow_lists_path}")
+        self.detection_filter = self.build_filter(allow_lists_path)
+        logger.info(f"Allow lists initialized: {len(self.global_allow_list)} global items")
 
         # Store the registry for later access
         self.registry = registry
@@ -86,8 +85,21 @@ class FrenchAnalyzer:
             registry=registry,
             default_score_threshold=0.4
         )
+        self._instrument(nlp_engine, registry)
         logger.info("FrenchAnalyzer initialization complete")
 
+    def _instrument(self, nlp_engine, registry):
+        """
+        Times spaCy NER and each recognizer separately in the stage metrics.
+        Recognizers run by the pattern scanner are timed together under
+        "pattern_scan": the first one called on a text runs the shared scan for all.
+        """
+        metrics.instrument(nlp_engine, "process_text", "ner")
+        scanned = {id(recognizer) for recognizer in self.pattern_scanner.recognizers}
+        for recognizer in registry.recognizers:
+            if id(recognizer) not in scanned:
+                metrics.instrument(recognizer, "analyze", f"recognizer.{recognizer.name}")
+
     def _load_custom_recognizers(self, registry, path):
         logger.debug(f"Loading custom recognizers from {path}")
         try:
@@ -103,7 +115,8 @@ class FrenchAnalyzer:
                         supported_entity=rec_config['entity'],
                         patterns=patterns,
                         context=rec_config.get('context'),
-                        supported_language="fr"
+                        supported_language="fr",
+                        name=rec_config.get('name', rec_config['entity'])
                     )
                     registry.add_recognizer(recognizer)
                     count += 1
@@ -111,22 +124,24 @@ class FrenchAnalyzer:
         except Exception as e:
             logger.error(f"Error loading custom recognizers: {e}", exc_info=True)
 
-    def _load_allow_lists(self, path):
-        with open(path, 'r', encoding='utf-8') as f:
-            config = yaml.safe_load(f)
-            if 'global' in config:
-                self.global_allow_list.extend(config['global'])
-            if 'document_specific' in config:
-                for doc_type, terms in config['document_specific'].items():
-                    if doc_type in self.doc_specific_allow_lists:
-                        self.doc_specific_allow_lists[doc_type].extend(terms)
-                    else:
-                        self.doc_specific_allow_lists[doc_type] = terms
+    @classmethod
+    def build_filter(cls, allow_lists_path=None):
+        """Builds the allow-list/threshold filter without loading any NLP model."""
+        detection_filter = DetectionFilter(cls.GLOBAL_ALLOW_LIST, cls.DOC_SPECIFIC_ALLOW_LISTS)
+        if allow_lists_path and os.path.exists(allow_lists_path):
+            logger.info(f"Loading custom allow lists from: {allow_lists_path}")
+            detection_filter.load_allow_lists(allow_lists_path)
+        else:
+            logger.debug(f"No custom allow lists file: {allow_lists_path}")
+        return detection_filter
 
-            # Clean up duplicates
-            self.global_allow_list = list(set(self.global_allow_list))
-            for doc_type in self.doc_specific_allow_lists:
-                self.doc_specific_allow_lists[doc_type] = list(set(self.doc_specific_allow_lists[doc_type]))
+    @property
+    def global_allow_list(self):
+        return self.detection_filter.global_allow_list
+
+    @property
+    def doc_specific_allow_lists(self):
+        return self.detection_filter.doc_specific_allow_lists
 
     def detect_doc_type(self, text, filename=""):
         logger.debug(f"Detecting document type for: {filename}")
@@ -153,81 +168,29 @@ class FrenchAnalyzer:
         return None
 
     def get_allow_list(self, doc_type=None, extra_allow_list=None):
-        allow_list = self.global_allow_list.copy()
-        if doc_type and doc_type in self.doc_specific_allow_lists:
-            allow_list.extend(self.doc_specific_allow_lists[doc_type])
-        if extra_allow_list:
-            allow_list.extend(extra_allow_list)
-        result = list(set(allow_list))
-        logger.debug(f"get_allow_list for doc_type '{doc_type}': {len(result)} items")
-        return result
+        return self.detection_filter.get_allow_list(doc_type, extra_allow_list)
 
     def analyze(self, text, entities=None, doc_type=None, extra_allow_list=None):
+        results = self.analyze_raw(text, entities=entities, doc_type=doc_type)
+
+        # Apply allow lists, doc_type specific filtering and confidence adjustments
+        filtered_results = self.detection_filter.apply(results, text, doc_type=doc_type, extra_allow_list=extra_allow_list)
+        logger.info(f"After allow-list and doc_type filtering: {len(filtered_results)} entities")
+
+        return filtered_results
+
+    def analyze_raw(self, text, entities=None, doc_type=None):
+        """Runs the recognizers only; allow lists and thresholds are left to the DetectionFilter."""
         logger.info(f"Analyzing text (doc_type: {doc_type}, text_length: {len(text)})")
-        allow_list = self.get_allow_list(doc_type, extra_allow_list)
-
-        # Make the allow_list case-insensitive by adding lowercased and capitalized versions
-        extended_allow_list = set()
-        for term in allow_list:
-            extended_allow_list.add(term)
-            extended_allow_list.add(term.lower())
-            extended_allow_list.add(term.upper())
-            extended_allow_list.add(term.capitalize())
-
-        results = self.engine.analyze(
-            text=text,
-            language="fr",
-            entities=entities,
-            allow_list=list(extended_allow_list)
-        )
+        with metrics.timer("analysis", doc_type):
+            results = self.engine.analyze(
+                text=text,
+                language="fr",
+                entities=entities
+            )
         logger.info(f"Analysis complete: found {len(results)} entities before filtering")
-        
-        # Apply doc_type specific filtering and confidence adjustments
-        filtered_results = self._filter_by_doc_type(results, doc_type)
-        logger.info(f"After doc_type filtering: {len(filtered_results)} entities")
-        
-        return filtered_results
+        return results
 
     def _filter_by_doc_type(self, results, doc_type):
         """Filter and adjust results based on document type"""
-        if not doc_type:
-            return results
-        
-        min_score_threshold = 0.5  # Default minimum score
-        entities_to_exclude = []
-        
-        # Configure filtering by document type
-        if doc_type == "facture":
-            min_score_threshold = 0.75  # Higher threshold for invoices
-            # Exclude license plates and money amounts from invoice analysis (not sensitive in this context)
-            entities_to_exclude = ["MONEY"]
-            logger.debug(f"Invoice mode: min_score={min_score_threshold}, excluding {entities_to_exclude}")
-        
-        elif doc_type in ["constat_auto", "constat_habitation"]:
-            min_score_threshold = 0.7
-            logger.debug(f"Report mode: min_score={min_score_threshold}")
-        
-        elif doc_type == "extrait_compte":
-            min_score_threshold = 0.8  # Very high for bank statements (sensitive)
-            logger.debug(f"Bank statement mode: min_score={min_score_threshold}")
-        
-        elif doc_type == "bulletin_salaire":
-            min_score_threshold = 0.75
-            logger.debug(f"Payroll mode: min_score={min_score_threshold}")
-        
-        # Apply filtering
-        filtered_results = []
-        for result in results:
-            # Exclude certain entity types based on doc_type
-            if result.entity_type in entities_to_exclude:
-                logger.debug(f"Excluding {result.entity_type} (not relevant for {doc_type})")
-                continue
-            
-            # Apply minimum score threshold
-            if result.score < min_score_threshold:
-                logger.debug(f"Filtering {result.entity_type} with score {result.score} < {min_score_threshold}")
-                continue
-            
-            filtered_results.append(result)
-        
-        return filtered_results
+        return self.detection_filter.filter_by_doc_type(results, doc_type)
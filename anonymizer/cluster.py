@@ -0,0 +1,309 @@
+import json
+import os
+import socket
+import threading
+import time
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+class FileLease:
+    """
+    Exclusive claim on one input file, held as a lock file created with
+    O_EXCL in a shared directory. The holder refreshes the lock's mtime while
+    it works; a lock not refreshed for lease_seconds is considered abandoned
+    and can be taken over by another node.
+
+    Expiry compares the lock's mtime, set by the file server, with the local
+    clock of the node checking it: on a network share, clock skew between
+    hosts shortens or lengthens the lease by the same amount, so the hosts'
+    clocks must be synchronized (NTP) and lease_seconds kept well above the
+    expected skew.
+    """
+
+    def __init__(self, lock_path, node_id, lease_seconds):
+        self.lock_path = lock_path
+        self.node_id = node_id
+        self.lease_seconds = lease_seconds
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._heartbeat = None
+        self._claim = None
+
+    def acquire(self):
+        if os.path.exists(self.lock_path) and not self._take_over_expired():
+            return False
+        self._claim = {"node": self.node_id, "claimed_at": datetime.now().isoformat()}
+        if not self._create_lock():
+            return False
+
+        self._heartbeat = threading.Thread(target=self._refresh, daemon=True)
+        self._heartbeat.start()
+        return True
+
+    def _create_lock(self):
+        try:
+            fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(self._claim, f)
+        return True
+
+    def _take_over_expired(self):
+        # The claim seen expiring (None if the holder died before writing it):
+        # the renamed file must still be this same claim
+        expired_claim = read_lock(self.lock_path)
+        if not lease_expired(self.lock_path, self.lease_seconds):
+            return False
+        # Only one node can rename the abandoned lock away
+        stale_path = f"{self.lock_path}.{self.node_id}.stale"
+        try:
+            os.rename(self.lock_path, stale_path)
+        except FileNotFoundError:
+            return False
+        if read_lock(stale_path) != expired_claim or not lease_expired(stale_path, self.lease_seconds):
+            # Another node replaced or refreshed the lock in between: give it back
+            try:
+                os.link(stale_path, self.lock_path)
+            except FileExistsError:
+                pass
+            os.unlink(stale_path)
+            return False
+        logger.warning(f"Taking over expired lease {os.path.basename(self.lock_path)} held by {(expired_claim or {}).get('node')}")
+        os.unlink(stale_path)
+        return True
+
+    def _refresh(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                os.utime(self.lock_path)
+            except FileNotFoundError:
+                # The lock is briefly missing while another node checks whether it
+                # expired (rename, then link back): re-created if it did not come back
+                if self._create_lock():
+                    logger.warning(f"Lease lock was missing, restored: {self.lock_path}")
+                    continue
+            claim = read_lock(self.lock_path)
+            # None: being renamed or written right now, checked again on the next beat
+            if claim is None or claim == self._claim:
+                continue
+            logger.error(f"Lease lost to {claim.get('node')}: {self.lock_path}")
+            self.lost.set()
+            return
+
+    def release(self):
+        self._stop.set()
+        if self._heartbeat:
+            self._heartbeat.join()
+        if read_lock_owner(self.lock_path) == self.node_id:
+            os.unlink(self.lock_path)
+
+def lease_expired(lock_path, lease_seconds):
+    """Compares the lock's mtime (the file server's clock) with the local clock."""
+    try:
+        return time.time() - os.stat(lock_path).st_mtime > lease_seconds
+    except FileNotFoundError:
+        return False
+
+def read_lock(lock_path):
+    """Returns the claim stored in a lock file ({"node", "claimed_at"}), or None."""
+    try:
+        with open(lock_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def read_lock_owner(lock_path):
+    return (read_lock(lock_path) or {}).get("node")
+
+def write_json_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+class ClusterState:
+    """
+    Shared state of a cluster run, kept as plain files so that it works on a
+    network share: locks/<file>.lock for claimed files, done/<file>.json and
+    failed/<file>.json for finished ones.
+    """
+
+    def __init__(self, cluster_dir, fingerprint=""):
+        self.cluster_dir = cluster_dir
+        self.fingerprint = fingerprint
+        self.lock_dir = os.path.join(cluster_dir, "locks")
+        self.done_dir = os.path.join(cluster_dir, "done")
+        self.failed_dir = os.path.join(cluster_dir, "failed")
+        for directory in (self.lock_dir, self.done_dir, self.failed_dir):
+            os.makedirs(directory, exist_ok=True)
+
+    def lock_path(self, filename):
+        return os.path.join(self.lock_dir, f"{filename}.lock")
+
+    def marker_path(self, filename, failed=False):
+        return os.path.join(self.failed_dir if failed else self.done_dir, f"{filename}.json")
+
+    def read_marker(self, filename, failed=False):
+        try:
+            with open(self.marker_path(filename, failed), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _current_marker(self, path, failed=False):
+        """Returns the marker if it was written for the current configuration and file content."""
+        marker = self.read_marker(os.path.basename(path), failed)
+        if marker is None:
+            return None
+        stat = os.stat(path)
+        if (marker.get("fingerprint") == self.fingerprint and marker.get("size") == stat.st_size
+                and marker.get("mtime") == stat.st_mtime):
+            return marker
+        return None
+
+    def is_done(self, path):
+        return self._current_marker(path) is not None
+
+    def has_failed(self, path):
+        """Failed files are retried only when they or the configuration change, or their marker is removed."""
+        return self._current_marker(path, failed=True) is not None
+
+    def is_finished(self, path):
+        return self.is_done(path) or self.has_failed(path)
+
+    def record(self, path, node_id, duration, output_path=None, error=None):
+        stat = os.stat(path)
+        marker = {
+            "filename": os.path.basename(path),
+            "node": node_id,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "fingerprint": self.fingerprint,
+            "duration": duration,
+            "finished_at": datetime.now().isoformat()
+        }
+        if error is None:
+            marker["output_path"] = output_path
+            write_json_atomic(self.marker_path(marker["filename"]), marker)
+            if os.path.exists(self.marker_path(marker["filename"], failed=True)):
+                os.unlink(self.marker_path(marker["filename"], failed=True))
+        else:
+            marker["error"] = error
+            write_json_atomic(self.marker_path(marker["filename"], failed=True), marker)
+
+class ClusterNode:
+    """
+    One node of a cluster run. Any number of nodes, on one or several hosts,
+    can share the same input folder and cluster directory: each file is
+    processed by the node that claims its lease, and the files of a node that
+    stopped refreshing its leases are picked up by the others.
+    """
+
+    def __init__(self, input_dir, cluster_dir, processor, fingerprint="", node_id=None, lease_seconds=300.0, poll_interval=5.0):
+        self.input_dir = input_dir
+        self.state = ClusterState(cluster_dir, fingerprint)
+        self.processor = processor
+        self.node_id = node_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+
+    def pending_files(self):
+        paths = sorted(os.path.join(self.input_dir, f) for f in os.listdir(self.input_dir))
+        return [path for path in paths if os.path.isfile(path) and not self.state.is_finished(path)]
+
+    def run(self):
+        """Processes files until every input file is finished. Returns (done_count, failed_count)."""
+        logger.info(f"Cluster node {self.node_id} started on {self.input_dir}")
+        done_count = 0
+        failed_count = 0
+        while True:
+            pending = self.pending_files()
+            if not pending:
+                break
+
+            claimed_any = False
+            for path in pending:
+                lease = FileLease(self.state.lock_path(os.path.basename(path)), self.node_id, self.lease_seconds)
+                if not lease.acquire():
+                    continue
+                claimed_any = True
+                try:
+                    # Another node may have finished it between listing and claiming
+                    if self.state.is_finished(path):
+                        continue
+                    if self._process(path):
+                        done_count += 1
+                    else:
+                        failed_count += 1
+                    if lease.lost.is_set():
+                        logger.warning(f"[{self.node_id}] Lease on {os.path.basename(path)} was taken over while processing it: it may have been processed twice")
+                finally:
+                    lease.release()
+
+            # The remaining files are held by other nodes: wait for them to finish or for their leases to expire
+            if not claimed_any:
+                time.sleep(self.poll_interval)
+
+        logger.info(f"Cluster node {self.node_id} finished. Done: {done_count}, Failed: {failed_count}")
+        return done_count, failed_count
+
+    def _process(self, path):
+        filename = os.path.basename(path)
+        logger.info(f"[{self.node_id}] Processing {filename}")
+        start = time.perf_counter()
+        try:
+            output_path = self.processor.process_file(path)
+            if not output_path:
+                raise ValueError("Processing returned no result")
+            if hasattr(self.processor, "logger"):
+                self.processor.logger.flush()
+        except Exception as e:
+            logger.error(f"[{self.node_id}] Error processing {filename}: {e}")
+            self.state.record(path, self.node_id, time.perf_counter() - start, error=f"{e}")
+            return False
+        self.state.record(path, self.node_id, time.perf_counter() - start, output_path=output_path)
+        return True
+
+def cluster_status(input_dir, cluster_dir, fingerprint="", lease_seconds=300.0):
+    """
+    Combined progress of all nodes: file counts by state and, per node, the
+    number of files done, failed and in progress with their total duration.
+    """
+    state = ClusterState(cluster_dir, fingerprint)
+    summary = {"total": 0, "done": 0, "failed": 0, "in_progress": 0, "stale": 0, "pending": 0, "nodes": {}, "errors": {}}
+
+    def node_entry(node):
+        return summary["nodes"].setdefault(node or "?", {"done": 0, "failed": 0, "in_progress": 0, "seconds": 0.0})
+
+    for filename in sorted(os.listdir(input_dir)):
+        path = os.path.join(input_dir, filename)
+        if not os.path.isfile(path):
+            continue
+        summary["total"] += 1
+
+        if state.is_done(path):
+            marker = state.read_marker(filename)
+            summary["done"] += 1
+            entry = node_entry(marker.get("node"))
+            entry["done"] += 1
+            entry["seconds"] += marker.get("duration") or 0.0
+        elif state.has_failed(path):
+            failed = state.read_marker(filename, failed=True)
+            summary["failed"] += 1
+            summary["errors"][filename] = failed.get("error")
+            entry = node_entry(failed.get("node"))
+            entry["failed"] += 1
+            entry["seconds"] += failed.get("duration") or 0.0
+        elif os.path.exists(state.lock_path(filename)):
+            if lease_expired(state.lock_path(filename), lease_seconds):
+                summary["stale"] += 1
+            else:
+                summary["in_progress"] += 1
+                node_entry(read_lock_owner(state.lock_path(filename)))["in_progress"] += 1
+        else:
+            summary["pending"] += 1
+
+    return summary
@@ -0,0 +1,134 @@
+import math
+import sys
+import numpy as np
+from PIL import Image
+
+class Detection:
+    """
+    A detected entity: its span in the page text plus the boxes to redact,
+    as [x0, y0, x1, y1] in page coordinates (PDF points for native pages,
+    pixels for images and rasterized scans).
+    """
+    __slots__ = ("entity_type", "start", "end", "score", "boxes")
+
+    def __init__(self, entity_type, start, end, score, boxes=None):
+        self.entity_type = entity_type
+        self.start = start
+        self.end = end
+        self.score = score
+        self.boxes = boxes if boxes is not None else []
+
+    @classmethod
+    def from_result(cls, result):
+        return cls(result.entity_type, result.start, result.end, result.score)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["entity_type"], data["start"], data["end"], data["score"], [list(box) for box in data.get("boxes", [])])
+
+    def to_dict(self):
+        return {
+            "entity_type": self.entity_type,
+            "start": self.start,
+            "end": self.end,
+            "score": self.score,
+            "boxes": self.boxes
+        }
+
+    def __repr__(self):
+        return f"Detection({self.entity_type}, {self.start}-{self.end}, score={self.score}, boxes={len(self.boxes)})"
+
+class AuditRecord:
+    """What the audit log keeps of a detection, without its geometry. Entity names are interned."""
+    __slots__ = ("entity_type", "start", "end", "score")
+
+    def __init__(self, entity_type, start, end, score):
+        self.entity_type = sys.intern(entity_type)
+        self.start = start
+        self.end = end
+        self.score = score
+
+    @classmethod
+    def from_detection(cls, detection):
+        return cls(detection.entity_type, detection.start, detection.end, detection.score)
+
+    def __repr__(self):
+        return f"AuditRecord({self.entity_type}, {self.start}-{self.end}, score={self.score})"
+
+def group_image_results(image_results):
+    """Groups per-word ImageRecognizerResults into one Detection per entity span."""
+    detections = {}
+    for res in image_results:
+        key = (res.entity_type, res.start, res.end)
+        detection = detections.get(key)
+        if detection is None:
+            detection = Detection(res.entity_type, res.start, res.end, res.score)
+            detections[key] = detection
+        box = [res.left, res.top, res.left + res.width, res.top + res.height]
+        if box not in detection.boxes:
+            detection.boxes.append(box)
+    return list(detections.values())
+
+def merge_line_boxes(boxes, max_gap_ratio=1.5):
+    """
+    Merges word boxes lying on the same line into one rectangle per line run.
+    Boxes overlap vertically by at least half of the smaller height and are
+    separated horizontally by at most max_gap_ratio times the line height.
+    """
+    rows = []
+    for box in sorted(boxes, key=lambda box: (box[1], box[0])):
+        for row in rows:
+            overlap = min(box[3], row["bottom"]) - max(box[1], row["top"])
+            if overlap >= min(box[3] - box[1], row["height"]) / 2:
+                row["boxes"].append(box)
+                row["top"], row["bottom"] = min(row["top"], box[1]), max(row["bottom"], box[3])
+                row["height"] = min(row["height"], box[3] - box[1])
+                break
+        else:
+            rows.append({"top": box[1], "bottom": box[3], "height": box[3] - box[1], "boxes": [box]})
+
+    lines = []
+    for row in rows:
+        line = None
+        for x0, y0, x1, y1 in sorted(row["boxes"]):
+            if line is not None and x0 - line[2] <= max_gap_ratio * max(y1 - y0, line[3] - line[1]):
+                line[:] = [line[0], min(line[1], y0), max(line[2], x1), max(line[3], y1)]
+            else:
+                line = [x0, y0, x1, y1]
+                lines.append(line)
+    return lines
+
+def fill_boxes(pixels, boxes, alpha=False):
+    """
+    Blackens the boxes in place on an (height, width[, channels]) pixel array
+    with slice assignments. Boxes are inclusive and clipped to the array.
+    With alpha, the last channel is made opaque instead.
+    """
+    height, width = pixels.shape[:2]
+    for x0, y0, x1, y1 in boxes:
+        left, top = max(int(math.floor(x0)), 0), max(int(math.floor(y0)), 0)
+        right, bottom = min(int(math.ceil(x1)) + 1, width), min(int(math.ceil(y1)) + 1, height)
+        if left >= right or top >= bottom:
+            continue
+        region = pixels[top:bottom, left:right]
+        if alpha:
+            region[..., :-1] = 0
+            region[..., -1] = 255
+        else:
+            region[...] = 0
+    return pixels
+
+def detection_rectangles(detections):
+    """Line-level rectangles covering all the boxes of the given detections, merged per entity."""
+    rectangles = []
+    for detection in detections:
+        rectangles.extend(merge_line_boxes(detection.boxes))
+    return rectangles
+
+def redact_image(image, detections):
+    """Returns a copy of the image with every detection filled in black, line by line."""
+    if image.mode not in ("RGB", "RGBA", "L", "1"):
+        image = image.convert("RGB")
+    pixels = np.array(image)
+    fill_boxes(pixels, detection_rectangles(detections), alpha=image.mode == "RGBA")
+    return Image.fromarray(pixels)
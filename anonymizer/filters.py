@@ -0,0 +1,111 @@
+import copy
+import yaml
+import logging
+
+logger = logging.getLogger(__name__)
+
+class DetectionFilter:
+    """
+    Post-analysis filtering of raw detections: ignored entity types, allow lists
+    and per-doc_type score thresholds. It needs no NLP model, so a new filter
+    configuration can be re-applied to stored detections without re-analysis.
+    """
+    DEFAULT_MIN_SCORE = 0.5
+
+    # Per doc_type minimum score and excluded entity types
+    DOC_TYPE_FILTERS = {
+        # Higher threshold for invoices, money amounts are not sensitive in this context
+        "facture": {"min_score": 0.75, "exclude": ["MONEY"]},
+        "constat_auto": {"min_score": 0.7},
+        "constat_habitation": {"min_score": 0.7},
+        # Very high for bank statements (sensitive)
+        "extrait_compte": {"min_score": 0.8},
+        "bulletin_salaire": {"min_score": 0.75}
+    }
+
+    def __init__(self, global_allow_list, doc_specific_allow_lists):
+        self.global_allow_list = list(global_allow_list)
+        self.doc_specific_allow_lists = {doc_type: list(terms) for doc_type, terms in doc_specific_allow_lists.items()}
+        self.default_min_score = self.DEFAULT_MIN_SCORE
+        self.doc_type_filters = copy.deepcopy(self.DOC_TYPE_FILTERS)
+
+    def load_allow_lists(self, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            config = yaml.safe_load(f)
+            if 'global' in config:
+                self.global_allow_list.extend(config['global'])
+            if 'document_specific' in config:
+                for doc_type, terms in config['document_specific'].items():
+                    if doc_type in self.doc_specific_allow_lists:
+                        self.doc_specific_allow_lists[doc_type].extend(terms)
+                    else:
+                        self.doc_specific_allow_lists[doc_type] = terms
+            if 'filters' in config:
+                for doc_type, settings in config['filters'].items():
+                    if doc_type == 'default':
+                        self.default_min_score = settings.get('min_score', self.default_min_score)
+                    else:
+                        self.doc_type_filters.setdefault(doc_type, {}).update(settings)
+
+            # Clean up duplicates
+            self.global_allow_list = list(set(self.global_allow_list))
+            for doc_type in self.doc_specific_allow_lists:
+                self.doc_specific_allow_lists[doc_type] = list(set(self.doc_specific_allow_lists[doc_type]))
+
+    def get_allow_list(self, doc_type=None, extra_allow_list=None):
+        allow_list = self.global_allow_list.copy()
+        if doc_type and doc_type in self.doc_specific_allow_lists:
+            allow_list.extend(self.doc_specific_allow_lists[doc_type])
+        if extra_allow_list:
+            allow_list.extend(extra_allow_list)
+        result = list(set(allow_list))
+        logger.debug(f"get_allow_list for doc_type '{doc_type}': {len(result)} items")
+        return result
+
+    def get_extended_allow_list(self, doc_type=None, extra_allow_list=None):
+        """Allow list made case-insensitive by adding lowercased, uppercased and capitalized versions."""
+        extended_allow_list = set()
+        for term in self.get_allow_list(doc_type, extra_allow_list):
+            extended_allow_list.add(term)
+            extended_allow_list.add(term.lower())
+            extended_allow_list.add(term.upper())
+            extended_allow_list.add(term.capitalize())
+        return extended_allow_list
+
+    def apply(self, results, text, doc_type=None, entities_to_ignore=None, extra_allow_list=None):
+        """Filters raw detections of `text` the same way a full analysis would."""
+        if entities_to_ignore:
+            results = [res for res in results if res.entity_type not in entities_to_ignore]
+
+        # Exact match on the detected text, like Presidio's allow_list
+        extended_allow_list = self.get_extended_allow_list(doc_type, extra_allow_list)
+        results = [res for res in results if text[res.start:res.end] not in extended_allow_list]
+
+        return self.filter_by_doc_type(results, doc_type)
+
+    def filter_by_doc_type(self, results, doc_type):
+        """Filter and adjust results based on document type"""
+        if not doc_type:
+            return results
+
+        settings = self.doc_type_filters.get(doc_type, {})
+        min_score_threshold = settings.get("min_score", self.default_min_score)
+        entities_to_exclude = settings.get("exclude", [])
+        logger.debug(f"{doc_type} mode: min_score={min_score_threshold}, excluding {entities_to_exclude}")
+
+        # Apply filtering
+        filtered_results = []
+        for result in results:
+            # Exclude certain entity types based on doc_type
+            if result.entity_type in entities_to_exclude:
+                logger.debug(f"Excluding {result.entity_type} (not relevant for {doc_type})")
+                continue
+
+            # Apply minimum score threshold
+            if result.score < min_score_threshold:
+                logger.debug(f"Filtering {result.entity_type} with score {result.score} < {min_score_threshold}")
+                continue
+
+            filtered_results.append(result)
+
+        return filtered_results
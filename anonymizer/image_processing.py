@@ -1,5 +1,6 @@
 import cv2
 import numpy as np
+import pytesseract
 from PIL import Image
 import logging
 
@@ -38,3 +39,102 @@ class ImagePreprocessor:
         except Exception as e:
             logger.error(f"Error during image preprocessing: {e}", exc_info=True)
             return image_path_or_pil
+
+def ocr_quality(ocr_result):
+    """Returns (word_count, mean_confidence) of a Tesseract-style OCR dict, ignoring empty and non-word boxes."""
+    confidences = []
+    for text, conf in zip(ocr_result.get("text", []), ocr_result.get("conf", [])):
+        try:
+            conf = float(conf)
+        except (TypeError, ValueError):
+            continue
+        if conf >= 0 and str(text).strip():
+            confidences.append(conf)
+    if not confidences:
+        return 0, 0.0
+    return len(confidences), sum(confidences) / len(confidences)
+
+def _text_mask(image, max_side):
+    """Downscaled binary mask of the dark (ink) pixels."""
+    gray = np.array(image.convert("L"))
+    scale = min(1.0, max_side / max(gray.shape))
+    if scale < 1.0:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    _, mask = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    return mask.astype(np.float32)
+
+def _line_score(mask, angle):
+    """How sharply text lines stand out in the row profile once the mask is rotated by angle (counterclockwise)."""
+    height, width = mask.shape
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    rotated = cv2.warpAffine(mask, matrix, (width, height), flags=cv2.INTER_NEAREST)
+    profile = rotated.sum(axis=1)
+    return float(np.square(np.diff(profile)).sum())
+
+def _osd_rotation(image):
+    """Counterclockwise angle given by Tesseract OSD, or None when OSD is unavailable or inconclusive."""
+    try:
+        osd = pytesseract.image_to_osd(image, output_type=pytesseract.Output.DICT)
+    except Exception as e:
+        logger.debug(f"Orientation detection unavailable: {e}")
+        return None
+    # OSD gives the clockwise rotation that makes the text upright
+    return -float(osd.get("rotate", 0)) % 360
+
+def estimate_orientation(image, max_side=800, max_skew=10.0, skew_step=0.5):
+    """
+    Cheap estimate of the counterclockwise rotation (in degrees) that makes
+    the text of a page upright: Tesseract OSD for the quarter turn, then a
+    row-profile search for the residual skew, both on a downscaled copy.
+    Without OSD data, a quarter turn is only detected when text lines are
+    clearly vertical, and its direction cannot be told apart.
+    """
+    small = image.copy()
+    small.thumbnail((max_side, max_side))
+    mask = _text_mask(small, max_side)
+    # Blank pages, or dark ones such as photos, have no text lines to measure
+    if not mask.any() or mask.mean() > 0.5:
+        return 0.0
+
+    rotation = _osd_rotation(small)
+    if rotation is None:
+        rotation = 90.0 if _line_score(mask, 90) > 2 * _line_score(mask, 0) else 0.0
+    if rotation:
+        mask = np.ascontiguousarray(np.rot90(mask, k=int(rotation // 90)))
+
+    # Smallest corrections first, so that ties (e.g. a uniform page) keep the page as it is
+    angles = sorted(np.arange(-max_skew, max_skew + skew_step / 2, skew_step), key=abs)
+    skew = max(angles, key=lambda angle: _line_score(mask, angle))
+    return (rotation + float(skew) + 180) % 360 - 180
+
+def rotate_image(image, angle):
+    """Rotates counterclockwise by angle degrees, expanding the canvas and filling the corners with white."""
+    fill = 255 if image.mode in ("L", "1") else (255,) * len(image.getbands())
+    return image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=fill)
+
+def map_boxes_to_original(ocr_result, angle, rotated_size, original_size):
+    """
+    Maps the word boxes of an OCR dict computed on rotate_image(image, angle)
+    back to the original image, as the axis-aligned box around each rotated box.
+    """
+    radians = np.radians(angle)
+    cos, sin = np.cos(radians), np.sin(radians)
+    rotated_center = np.array(rotated_size, dtype=float) / 2
+    original_center = np.array(original_size, dtype=float) / 2
+
+    mapped = dict(ocr_result)
+    lefts, tops, widths, heights = [], [], [], []
+    for left, top, width, height in zip(ocr_result["left"], ocr_result["top"], ocr_result["width"], ocr_result["height"]):
+        corners = np.array([[left, top], [left + width, top], [left, top + height], [left + width, top + height]], dtype=float)
+        dx, dy = (corners - rotated_center).T
+        # Inverse of the counterclockwise rotation, in image coordinates (y pointing down)
+        points = np.stack([dx * cos - dy * sin, dx * sin + dy * cos], axis=1) + original_center
+        x0, y0 = np.floor(points.min(axis=0))
+        x1, y1 = np.ceil(points.max(axis=0))
+        x0, y0 = max(0, int(x0)), max(0, int(y0))
+        lefts.append(x0)
+        tops.append(y0)
+        widths.append(max(1, min(original_size[0], int(x1)) - x0))
+        heights.append(max(1, min(original_size[1], int(y1)) - y0))
+    mapped.update(left=lefts, top=tops, width=widths, height=heights)
+    return mapped
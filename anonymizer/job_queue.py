@@ -0,0 +1,311 @@
+import os
+import sqlite3
+import time
+import traceback
+import multiprocessing
+from datetime import datetime
+import fitz  # PyMuPDF
+from PIL import Image
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Relative cost units used to schedule the longest jobs first
+NATIVE_PAGE_COST = 1.0
+SCANNED_PAGE_COST = 10.0
+COST_PER_MB = 0.5
+# Images above this many pixels (about an A4 page at 300 dpi) cost proportionally more
+REFERENCE_PIXELS = 2480 * 3508
+
+def estimate_cost(path):
+    """
+    Cheap processing cost estimate from page count, file size and whether pages
+    need OCR. Only the PDF structure and the first page text (or the image header)
+    are read.
+    """
+    size_mb = os.path.getsize(path) / (1024 * 1024)
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        if ext == '.pdf':
+            with fitz.open(path) as doc:
+                pages = len(doc)
+                scanned = pages > 0 and not doc[0].get_text().strip()
+            page_cost = SCANNED_PAGE_COST if scanned else NATIVE_PAGE_COST
+            return pages * page_cost + size_mb * COST_PER_MB
+        with Image.open(path) as image:
+            width, height = image.size
+        return SCANNED_PAGE_COST * max(1.0, width * height / REFERENCE_PIXELS) + size_mb * COST_PER_MB
+    except Exception as e:
+        logger.warning(f"Could not estimate cost of {path}: {e}")
+        return size_mb * COST_PER_MB
+
+class JobQueue:
+    """
+    Durable local job queue stored in SQLite. Jobs are claimed by priority,
+    then by estimated cost (longest job first). Failed jobs are retried with
+    exponential backoff and moved to the dead-letter list after max_attempts.
+    """
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY,
+            path TEXT NOT NULL UNIQUE,
+            priority INTEGER NOT NULL DEFAULT 0,
+            cost REAL NOT NULL DEFAULT 0,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL DEFAULT 0,
+            last_error TEXT,
+            updated_at TEXT,
+            signature TEXT
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_jobs_schedule ON jobs(status, priority DESC, cost DESC)"
+    ]
+
+    def __init__(self, db_path, max_attempts=3, retry_delay=30.0, timeout=30.0):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.connection = sqlite3.connect(db_path, timeout=timeout, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        for statement in self.SCHEMA:
+            self.connection.execute(statement)
+        # Queues created before the signature column: their jobs are reset once on the next enqueue
+        columns = {row[1] for row in self.connection.execute("PRAGMA table_info(jobs)")}
+        if "signature" not in columns:
+            self.connection.execute("ALTER TABLE jobs ADD COLUMN signature TEXT")
+
+    def enqueue(self, path, priority=0, cost=None, reset=False):
+        """
+        Adds a file as a pending job. A job already in the queue keeps its
+        status and attempt count, so that an interrupted queue resumes and
+        dead letters stay dead; it starts over only when it was done, when
+        the file (size, mtime) or its cost changed, or when reset is True.
+        """
+        if cost is None:
+            cost = estimate_cost(path)
+        stat = os.stat(path)
+        self.connection.execute(
+            """INSERT INTO jobs (path, priority, cost, status, attempts, next_attempt_at, last_error, updated_at, signature)
+               VALUES (?, ?, ?, 'pending', 0, 0, NULL, ?, ?)
+               ON CONFLICT(path) DO UPDATE SET priority = excluded.priority, cost = excluded.cost,
+                   status = 'pending', attempts = 0, next_attempt_at = 0, last_error = NULL,
+                   updated_at = excluded.updated_at, signature = excluded.signature
+               WHERE ? OR jobs.status = 'done' OR jobs.signature IS NOT excluded.signature OR jobs.cost != excluded.cost""",
+            (os.path.abspath(path), priority, cost, datetime.now().isoformat(), f"{stat.st_size}:{stat.st_mtime_ns}", reset)
+        )
+
+    def claim(self):
+        """Atomically takes the next runnable job. Returns (id, path, attempts) or None."""
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.connection.execute(
+                "SELECT id, path, attempts FROM jobs WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY priority DESC, cost DESC, id LIMIT 1",
+                (time.time(),)
+            ).fetchone()
+            if row:
+                self.connection.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    (datetime.now().isoformat(), row[0])
+                )
+            self.connection.execute("COMMIT")
+        except Exception:
+            self.connection.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        return row[0], row[1], row[2] + 1
+
+    def complete(self, job_id):
+        self._set_status(job_id, "done")
+
+    def fail(self, job_id, error):
+        """Schedules a retry with exponential backoff, or dead-letters the job. Returns the new status."""
+        attempts = self.connection.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+        if attempts >= self.max_attempts:
+            self._set_status(job_id, "dead", error)
+            return "dead"
+        delay = self.retry_delay * (2 ** (attempts - 1))
+        self.connection.execute(
+            "UPDATE jobs SET status = 'pending', next_attempt_at = ?, last_error = ?, updated_at = ? WHERE id = ?",
+            (time.time() + delay, error, datetime.now().isoformat(), job_id)
+        )
+        return "pending"
+
+    def _set_status(self, job_id, status, error=None):
+        self.connection.execute(
+            "UPDATE jobs SET status = ?, last_error = COALESCE(?, last_error), updated_at = ? WHERE id = ?",
+            (status, error, datetime.now().isoformat(), job_id)
+        )
+
+    def requeue_stale(self):
+        """Jobs left 'running' by a crashed run go back to pending. Returns their number."""
+        cursor = self.connection.execute("UPDATE jobs SET status = 'pending' WHERE status = 'running'")
+        return cursor.rowcount
+
+    def has_unfinished(self):
+        """True while jobs are pending (including those waiting for a retry) or running."""
+        row = self.connection.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('pending', 'running')").fetchone()
+        return row[0] > 0
+
+    def counts(self):
+        return dict(self.connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def dead_letters(self):
+        """Returns (path, attempts, last_error) of every dead-lettered job."""
+        return self.connection.execute("SELECT path, attempts, last_error FROM jobs WHERE status = 'dead' ORDER BY path").fetchall()
+
+    def close(self):
+        self.connection.close()
+
+def _worker_main(connection, processor_factory):
+    """Worker process: builds the processor once, then runs the jobs sent by the supervisor."""
+    try:
+        processor = processor_factory()
+    except Exception as e:
+        connection.send(("init_error", None, f"{e}"))
+        return
+    connection.send(("ready", None, None))
+
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        job_id, path = message
+        try:
+            result = processor.process_file(path)
+            # Buffered audit entries must not be lost if this process is killed later
+            if hasattr(processor, "logger"):
+                processor.logger.flush()
+            if result:
+                connection.send(("done", job_id, result))
+            else:
+                connection.send(("error", job_id, "Processing returned no result"))
+        except Exception as e:
+            connection.send(("error", job_id, f"{e}\n{traceback.format_exc()}"))
+
+    if hasattr(processor, "logger"):
+        processor.logger.close()
+
+class _Worker:
+    def __init__(self, processor_factory):
+        self.connection, child_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_worker_main, args=(child_connection, processor_factory), daemon=True)
+        self.process.start()
+        child_connection.close()
+        self.ready = False
+        self.job = None
+        self.started_at = None
+
+    def submit(self, job):
+        self.job = job
+        self.started_at = time.monotonic()
+        self.connection.send((job[0], job[1]))
+
+    def kill(self):
+        self.process.terminate()
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(30)
+        if self.process.is_alive():
+            self.kill()
+
+class QueueRunner:
+    """
+    Runs queued jobs in separate worker processes. A job exceeding the
+    wall-clock timeout, or whose worker crashes, is failed and its worker
+    replaced, so one pathological file cannot stall or take down the run.
+    """
+
+    def __init__(self, queue, processor_factory, workers=1, timeout=600.0, on_done=None, poll_interval=0.1):
+        self.queue = queue
+        self.processor_factory = processor_factory
+        self.workers = workers
+        self.timeout = timeout
+        self.on_done = on_done
+        self.poll_interval = poll_interval
+
+    def run(self):
+        stale = self.queue.requeue_stale()
+        if stale:
+            logger.info(f"Requeued {stale} jobs interrupted by a previous run")
+
+        workers = [_Worker(self.processor_factory) for _ in range(self.workers)]
+        try:
+            while True:
+                for i, worker in enumerate(workers):
+                    workers[i] = self._check_worker(worker)
+
+                for worker in workers:
+                    if worker.ready and worker.job is None:
+                        job = self.queue.claim()
+                        if job is None:
+                            break
+                        logger.info(f"Starting {os.path.basename(job[1])} (attempt {job[2]})")
+                        worker.submit(job)
+
+                if not any(worker.job for worker in workers) and not self.queue.has_unfinished():
+                    break
+                time.sleep(self.poll_interval)
+        finally:
+            for worker in workers:
+                if worker.job:
+                    worker.kill()
+                else:
+                    worker.stop()
+
+        return self.queue.counts()
+
+    def _check_worker(self, worker):
+        """Handles the worker's messages, timeout and crash. Returns the worker to keep using."""
+        while worker.connection.poll():
+            try:
+                status, job_id, payload = worker.connection.recv()
+            except (EOFError, OSError):
+                break
+            if status == "init_error":
+                raise RuntimeError(f"Worker failed to initialize: {payload}")
+            if status == "ready":
+                worker.ready = True
+                continue
+
+            path = worker.job[1]
+            if status == "done":
+                self.queue.complete(job_id)
+                logger.info(f"Job done: {os.path.basename(path)}")
+                if self.on_done:
+                    self.on_done(path, payload)
+            else:
+                self._fail(job_id, path, payload)
+            worker.job = None
+            worker.started_at = None
+
+        if worker.job and time.monotonic() - worker.started_at > self.timeout:
+            logger.error(f"Job timed out after {self.timeout}s: {worker.job[1]}")
+            worker.kill()
+            self._fail(worker.job[0], worker.job[1], f"Timed out after {self.timeout}s")
+            return _Worker(self.processor_factory)
+
+        if not worker.process.is_alive():
+            if not worker.ready:
+                raise RuntimeError(f"Worker exited during initialization (exit code {worker.process.exitcode})")
+            if worker.job:
+                logger.error(f"Worker crashed (exit code {worker.process.exitcode}) on {worker.job[1]}")
+                self._fail(worker.job[0], worker.job[1], f"Worker crashed with exit code {worker.process.exitcode}")
+            return _Worker(self.processor_factory)
+
+        return worker
+
+    def _fail(self, job_id, path, error):
+        status = self.queue.fail(job_id, error)
+        if status == "dead":
+            logger.error(f"Job dead-lettered: {os.path.basename(path)}")
+        else:
+            logger.warning(f"Job failed, will retry: {os.path.basename(path)}")
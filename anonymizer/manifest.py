@@ -0,0 +1,85 @@
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime
+from .utils import file_sha256
+import logging
+
+logger = logging.getLogger(__name__)
+
+def config_fingerprint(config_files=(), **options):
+    """
+    Hash of everything that changes the output of a run: the content of the
+    configuration files and the processing options. Files processed under
+    another fingerprint are processed again.
+    """
+    digest = hashlib.sha256()
+    for path in config_files:
+        digest.update(str(path).encode("utf-8"))
+        if path and os.path.exists(path):
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    digest.update(json.dumps(options, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+class ProcessedManifest:
+    """
+    Persistent record of the files already processed, keyed by path, with
+    their size, mtime, content hash and the configuration fingerprint.
+    Each entry is committed as soon as the file is done, so an interrupted
+    run resumes where it stopped.
+    """
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS processed (path TEXT PRIMARY KEY, size INTEGER, mtime REAL, sha256 TEXT, fingerprint TEXT, output_path TEXT, processed_at TEXT)"
+    ]
+
+    def __init__(self, db_path, fingerprint, timeout=30.0):
+        self.db_path = db_path
+        self.fingerprint = fingerprint
+        self.connection = sqlite3.connect(db_path, timeout=timeout, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        for statement in self.SCHEMA:
+            self.connection.execute(statement)
+
+    def is_processed(self, path):
+        """
+        True if the file was already processed with the current configuration.
+        The content is only hashed when size or mtime changed since then.
+        """
+        row = self.connection.execute(
+            "SELECT size, mtime, sha256, fingerprint, output_path FROM processed WHERE path = ?",
+            (os.path.abspath(path),)
+        ).fetchone()
+        if row is None:
+            return False
+
+        size, mtime, sha256, fingerprint, output_path = row
+        if fingerprint != self.fingerprint:
+            return False
+        if output_path and not os.path.exists(output_path):
+            return False
+
+        stat = os.stat(path)
+        if stat.st_size == size and stat.st_mtime == mtime:
+            return True
+        if stat.st_size != size or file_sha256(path) != sha256:
+            return False
+
+        # Touched but unchanged: remember the new mtime to skip hashing next time
+        self.connection.execute("UPDATE processed SET mtime = ? WHERE path = ?", (stat.st_mtime, os.path.abspath(path)))
+        return True
+
+    def mark_processed(self, path, output_path=None):
+        stat = os.stat(path)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO processed (path, size, mtime, sha256, fingerprint, output_path, processed_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (os.path.abspath(path), stat.st_size, stat.st_mtime, file_sha256(path), self.fingerprint,
+             os.path.abspath(output_path) if output_path else None, datetime.now().isoformat())
+        )
+
+    def filter_pending(self, paths):
+        return [path for path in paths if not self.is_processed(path)]
+
+    def close(self):
+        self.connection.close()
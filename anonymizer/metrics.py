@@ -0,0 +1,158 @@
+import cProfile
+import functools
+import heapq
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+import logging
+
+logger = logging.getLogger(__name__)
+
+class StageMetrics:
+    """
+    Collects per-stage durations as histograms keyed by (stage, doc_type).
+    Can be exported as a JSON snapshot or a Prometheus text file.
+    """
+    # Histogram upper bounds in seconds (+Inf is implicit)
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+    METRIC_NAME = "anonymizer_stage_duration_seconds"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._histograms = {}
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+
+    @property
+    def current_doc_type(self):
+        return getattr(self._local, "doc_type", None)
+
+    @contextmanager
+    def doc_type(self, doc_type):
+        """Labels every timer opened in this thread with the given doc_type."""
+        previous = self.current_doc_type
+        self._local.doc_type = doc_type
+        try:
+            yield
+        finally:
+            self._local.doc_type = previous
+
+    def observe(self, stage, seconds, doc_type=None):
+        key = (stage, doc_type or self.current_doc_type or "unknown")
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = {"count": 0, "sum": 0.0, "min": seconds, "max": seconds, "buckets": [0] * len(self.BUCKETS)}
+                self._histograms[key] = histogram
+            histogram["count"] += 1
+            histogram["sum"] += seconds
+            histogram["min"] = min(histogram["min"], seconds)
+            histogram["max"] = max(histogram["max"], seconds)
+            for i, bound in enumerate(self.BUCKETS):
+                if seconds <= bound:
+                    histogram["buckets"][i] += 1
+
+    @contextmanager
+    def timer(self, stage, doc_type=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, doc_type)
+
+    def instrument(self, obj, method_name, stage):
+        """Replaces obj.method_name with a version timed under the given stage."""
+        method = getattr(obj, method_name)
+        if getattr(method, "_timed_stage", None):
+            return
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            with self.timer(stage):
+                return method(*args, **kwargs)
+
+        timed._timed_stage = stage
+        setattr(obj, method_name, timed)
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = {}
+            for (stage, doc_type), histogram in sorted(self._histograms.items()):
+                snapshot.setdefault(stage, {})[doc_type] = {
+                    "count": histogram["count"],
+                    "sum": round(histogram["sum"], 6),
+                    "min": round(histogram["min"], 6),
+                    "max": round(histogram["max"], 6),
+                    "mean": round(histogram["sum"] / histogram["count"], 6),
+                    "buckets": {str(bound): n for bound, n in zip(self.BUCKETS, histogram["buckets"])}
+                }
+            return snapshot
+
+    def to_prometheus(self):
+        lines = [
+            f"# HELP {self.METRIC_NAME} Duration of each anonymization stage in seconds.",
+            f"# TYPE {self.METRIC_NAME} histogram"
+        ]
+        with self._lock:
+            for (stage, doc_type), histogram in sorted(self._histograms.items()):
+                labels = f'stage="{stage}",doc_type="{doc_type}"'
+                for bound, n in zip(self.BUCKETS, histogram["buckets"]):
+                    lines.append(f'{self.METRIC_NAME}_bucket{{{labels},le="{bound}"}} {n}')
+                lines.append(f'{self.METRIC_NAME}_bucket{{{labels},le="+Inf"}} {histogram["count"]}')
+                lines.append(f'{self.METRIC_NAME}_sum{{{labels}}} {histogram["sum"]:.6f}')
+                lines.append(f'{self.METRIC_NAME}_count{{{labels}}} {histogram["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """Writes a Prometheus text file if path ends with .prom, a JSON snapshot otherwise."""
+        with open(path, 'w', encoding='utf-8') as f:
+            if path.endswith(".prom"):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.snapshot(), f, indent=4, ensure_ascii=False)
+        logger.info(f"Metrics exported to {path}")
+        return path
+
+class SlowestProfiles:
+    """Runs cProfile around each file and keeps the stats of the N slowest ones."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._heap = []
+        self._counter = 0
+
+    @contextmanager
+    def profile(self, name):
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - start
+            self._counter += 1
+            entry = (elapsed, self._counter, name, profiler)
+            if len(self._heap) < self.limit:
+                heapq.heappush(self._heap, entry)
+            elif elapsed > self._heap[0][0]:
+                heapq.heapreplace(self._heap, entry)
+
+    def dump(self, directory):
+        """Writes one .prof file per kept file, slowest first. Returns the written paths."""
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for rank, (elapsed, _, name, profiler) in enumerate(sorted(self._heap, reverse=True), start=1):
+            path = os.path.join(directory, f"{rank:02d}_{os.path.splitext(os.path.basename(name))[0]}.prof")
+            profiler.dump_stats(path)
+            logger.info(f"Profile #{rank}: {name} took {elapsed:.2f}s -> {path}")
+            paths.append(path)
+        return paths
+
+# Process-wide collector used by the pipeline stages
+metrics = StageMetrics()
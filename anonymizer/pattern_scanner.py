@@ -0,0 +1,292 @@
+import re
+import threading
+import regex
+from presidio_analyzer import PatternRecognizer, EntityRecognizer, RecognizerResult
+from .metrics import metrics
+import logging
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+try:
+    from presidio_analyzer.pattern_recognizer import REGEX_TIMEOUT_SECONDS
+except ImportError:
+    REGEX_TIMEOUT_SECONDS = None
+
+logger = logging.getLogger(__name__)
+
+C = sre_parse  # opcodes are re-exported by the parser module
+REPEATS = (C.MAX_REPEAT, C.MIN_REPEAT) + ((C.POSSESSIVE_REPEAT,) if hasattr(C, "POSSESSIVE_REPEAT") else ())
+# Above this many alternative paths, a branch is ignored by the prefilter
+MAX_PATHS = 64
+# Digits separated by at most one whitespace, as matched by the \d{3}\s?\d{3} style patterns
+DIGIT_RUN = re.compile(r"\d(?:\s?\d)*")
+
+def _is_digit_set(items):
+    """True for [0-9], \\d and the like: a single position that only matches digits."""
+    for op, av in items:
+        if op is C.CATEGORY and av is C.CATEGORY_DIGIT:
+            continue
+        if op is C.RANGE and 48 <= av[0] <= av[1] <= 57:
+            continue
+        if op is C.LITERAL and 48 <= av <= 57:
+            continue
+        return False
+    return bool(items)
+
+def _is_space(item):
+    op, av = item
+    if op is C.LITERAL:
+        return chr(av).isspace()
+    return op is C.IN and all(sub_op is C.CATEGORY and sub_av is C.CATEGORY_SPACE for sub_op, sub_av in av)
+
+class _Path:
+    """Requirements collected along one alternative of a regex: required literals and digit runs."""
+    __slots__ = ("literals", "buffer", "run", "best")
+
+    def __init__(self, literals=(), buffer="", run=0, best=0):
+        self.literals = literals
+        self.buffer = buffer
+        self.run = run
+        self.best = best
+
+    def copy(self):
+        return _Path(self.literals, self.buffer, self.run, self.best)
+
+    def flush(self):
+        if len(self.buffer) >= 2:
+            self.literals = self.literals + (self.buffer,)
+        self.buffer = ""
+
+    def close_run(self):
+        self.best = max(self.best, self.run)
+        self.run = 0
+
+    def cut(self):
+        self.flush()
+        self.close_run()
+
+def _walk(items, paths):
+    """Advances every path over a parsed regex sequence. Unknown constructs only weaken the requirements."""
+    for op, av in items:
+        if op is C.IN and len(av) == 1 and av[0][0] is C.LITERAL:
+            # [.] and the like are plain characters
+            op, av = av[0]
+        if op is C.LITERAL:
+            ch = chr(av)
+            for path in paths:
+                if ch.isascii() and not ch.isspace():
+                    path.buffer += ch.casefold()
+                else:
+                    path.flush()
+                if "0" <= ch <= "9":
+                    path.run += 1
+                else:
+                    path.close_run()
+        elif op is C.IN and _is_digit_set(av):
+            for path in paths:
+                path.flush()
+                path.run += 1
+        elif op in REPEATS:
+            low, high, sub = av
+            sub = list(sub)
+            if len(sub) == 1 and sub[0][0] is C.IN and _is_digit_set(sub[0][1]):
+                for path in paths:
+                    path.flush()
+                    path.run += low
+            elif len(sub) == 1 and _is_space(sub[0]) and high <= 1:
+                # \s? keeps a digit run going, as in the text-side measure
+                for path in paths:
+                    path.flush()
+            elif low >= 1:
+                paths = _walk(sub, paths)
+                for path in paths:
+                    path.cut()
+            else:
+                for path in paths:
+                    path.cut()
+        elif op is C.SUBPATTERN:
+            paths = _walk(list(av[-1]), paths)
+        elif op is C.BRANCH:
+            alternatives = av[1]
+            if len(paths) * len(alternatives) > MAX_PATHS:
+                for path in paths:
+                    path.cut()
+                continue
+            paths = [new_path for alternative in alternatives for path in paths
+                     for new_path in _walk(list(alternative), [path.copy()])]
+        elif op in (C.AT, C.ASSERT, C.ASSERT_NOT):
+            # Zero-width: nothing consumed
+            continue
+        else:
+            for path in paths:
+                path.cut()
+    return paths
+
+def regex_requirements(pattern):
+    """
+    Cheap necessary conditions for `pattern` to match, one per alternative:
+    (required case-folded literals, minimum run of digits). None if the regex
+    cannot be analyzed, in which case it always runs.
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception:
+        return None
+    paths = _walk(list(parsed), [_Path()])
+    requirements = []
+    for path in paths:
+        path.cut()
+        requirements.append((path.literals, path.best))
+    return requirements
+
+class TextFeatures:
+    """What the prefilter needs from a text, computed once per text."""
+    __slots__ = ("text", "folded", "max_digit_run")
+
+    def __init__(self, text):
+        self.text = text
+        self.folded = text.casefold()
+        # Run length includes the separators: an overestimate only lets more patterns run
+        self.max_digit_run = max((len(run) for run in DIGIT_RUN.findall(text)), default=0)
+
+    def satisfies(self, requirements, ignore_case):
+        if requirements is None:
+            return True
+        haystack = self.folded if ignore_case else self.text
+        for literals, digit_run in requirements:
+            if digit_run <= self.max_digit_run and all(literal in haystack for literal in literals):
+                return True
+        return False
+
+class _CompiledPattern:
+    """One distinct (regex, flags) pair, shared by every recognizer pattern using it."""
+    __slots__ = ("regex", "flags", "compiled", "requirements", "users")
+
+    def __init__(self, pattern_regex, flags):
+        self.regex = pattern_regex
+        self.flags = flags
+        self.compiled = regex.compile(pattern_regex, flags=flags)
+        self.requirements = regex_requirements(pattern_regex)
+        if self.requirements is not None and not flags & regex.IGNORECASE:
+            # Literals were case-folded during analysis: only keep digit requirements
+            self.requirements = [((), digit_run) for _, digit_run in self.requirements]
+        self.users = []
+
+    def finditer(self, text):
+        if REGEX_TIMEOUT_SECONDS is None:
+            return self.compiled.finditer(text)
+        return self.compiled.finditer(text, timeout=REGEX_TIMEOUT_SECONDS)
+
+class PatternScanner:
+    """
+    Runs the regex patterns of every pattern recognizer in a single pass per
+    text. A prefilter computed once per text (case-folded text and longest
+    digit run) skips the patterns that cannot match, identical regexes are
+    evaluated once, and the matches are dispatched to each recognizer with
+    its entity, score and validation, exactly as PatternRecognizer would.
+    """
+
+    def __init__(self, recognizers):
+        self.recognizers = [rec for rec in recognizers if self.supports(rec)]
+        self.patterns = {}
+        for recognizer in self.recognizers:
+            for pattern in recognizer.patterns:
+                key = (pattern.regex, recognizer.global_regex_flags)
+                compiled = self.patterns.get(key)
+                if compiled is None:
+                    compiled = self.patterns[key] = _CompiledPattern(*key)
+                compiled.users.append((recognizer, pattern))
+        self._local = threading.local()
+        logger.info(f"Pattern scanner: {len(self.recognizers)} recognizers, {len(self.patterns)} distinct regexes")
+
+    @staticmethod
+    def supports(recognizer):
+        """Only recognizers using the stock pattern matching can be scanned on their behalf."""
+        return (isinstance(recognizer, PatternRecognizer) and bool(recognizer.patterns)
+                and type(recognizer).analyze is PatternRecognizer.analyze)
+
+    @classmethod
+    def install(cls, recognizers):
+        """Routes the analyze() of every supported recognizer through a shared scanner."""
+        scanner = cls(recognizers)
+        for recognizer in scanner.recognizers:
+            recognizer.analyze = scanner._analyzer_for(recognizer)
+        return scanner
+
+    def _analyzer_for(self, recognizer):
+        original = recognizer.analyze
+
+        def analyze(text, entities=None, nlp_artifacts=None, regex_flags=None):
+            if regex_flags is not None:
+                return original(text, entities, nlp_artifacts, regex_flags)
+            return self.results_for(recognizer, text)
+
+        return analyze
+
+    def results_for(self, recognizer, text):
+        """Returns the recognizer's results, scanning the text once for all recognizers."""
+        local = self._local
+        pending = getattr(local, "pending", None)
+        # Results are handed out once: analyzing the same text again gets fresh objects
+        if getattr(local, "text", None) != text or recognizer.id not in pending:
+            local.text = text
+            local.pending = pending = self.scan(text)
+        return pending.pop(recognizer.id)
+
+    def scan(self, text):
+        """Returns {recognizer id: results} for every scanned recognizer."""
+        with metrics.timer("pattern_scan"):
+            features = TextFeatures(text)
+            results = {recognizer.id: [] for recognizer in self.recognizers}
+            skipped = 0
+            for compiled in self.patterns.values():
+                if not features.satisfies(compiled.requirements, compiled.flags & regex.IGNORECASE):
+                    skipped += 1
+                    continue
+                try:
+                    matches = [match.span() for match in compiled.finditer(text)]
+                except TimeoutError:
+                    logger.warning(f"Regex pattern '{compiled.regex}' timed out, skipping.")
+                    continue
+                for recognizer, pattern in compiled.users:
+                    self._dispatch(recognizer, pattern, compiled.flags, text, matches, results[recognizer.id])
+
+            for recognizer_id, recognizer_results in results.items():
+                results[recognizer_id] = EntityRecognizer.remove_duplicates(recognizer_results)
+        logger.debug(f"Pattern scan: {len(self.patterns) - skipped} regexes run, {skipped} skipped by the prefilter")
+        return results
+
+    @staticmethod
+    def _dispatch(recognizer, pattern, flags, text, matches, results):
+        for start, end in matches:
+            current_match = text[start:end]
+            if current_match == "":
+                continue
+
+            validation_result = recognizer.validate_result(current_match)
+            description = recognizer.build_regex_explanation(
+                recognizer.name, pattern.name, pattern.regex, pattern.score, validation_result, flags
+            )
+            result = RecognizerResult(
+                entity_type=recognizer.supported_entities[0],
+                start=start,
+                end=end,
+                score=pattern.score,
+                analysis_explanation=description,
+                recognition_metadata={
+                    RecognizerResult.RECOGNIZER_NAME_KEY: recognizer.name,
+                    RecognizerResult.RECOGNIZER_IDENTIFIER_KEY: recognizer.id,
+                },
+            )
+            if validation_result is not None:
+                result.score = EntityRecognizer.MAX_SCORE if validation_result else EntityRecognizer.MIN_SCORE
+            invalidation_result = recognizer.invalidate_result(current_match)
+            if invalidation_result:
+                result.score = EntityRecognizer.MIN_SCORE
+
+            if result.score > EntityRecognizer.MIN_SCORE:
+                results.append(result)
+            description.score = result.score
@@ -1,17 +1,47 @@
 import fitz  # PyMuPDF
 from .analyzer import FrenchAnalyzer
 from .redactor import FrenchImageRedactor
+from .detections import Detection, AuditRecord, detection_rectangles, fill_boxes
+from .metrics import metrics
+from PIL import Image
+import numpy as np
 import os
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Placeholder URI prefix of the internal links between page windows, while a window is redacted
+CROSS_WINDOW_URI = "x-anonymizer-window-link:"
+
 class PDFProcessor:
-    def __init__(self, analyzer: FrenchAnalyzer, image_redactor: FrenchImageRedactor):
+    # Options used for every output PDF (optimized for file size)
+    SAVE_OPTIONS = {"garbage": 4, "deflate": True, "clean": True}
+    # Rasterization zoom used to OCR scanned pages
+    SCAN_ZOOM = 2
+    # Fixed per-page overhead (page objects, OCR data) added to the pixmap size in memory estimates
+    PAGE_OVERHEAD_BYTES = 2 * 1024 * 1024
+
+    def __init__(self, analyzer: FrenchAnalyzer, image_redactor: FrenchImageRedactor, page_window=None, max_memory_mb=None):
         self.analyzer = analyzer
         self.image_redactor = image_redactor
+        # Large PDFs are processed page window by page window, either of a fixed
+        # size or sized so that the pages held in memory stay under max_memory_mb
+        self.page_window = page_window
+        self.max_memory_mb = max_memory_mb
+
+    def window_size(self, doc):
+        """Number of pages per window for this document, or None to process it in one go."""
+        if self.page_window:
+            size = self.page_window
+        elif self.max_memory_mb:
+            rect = doc[0].rect
+            page_bytes = rect.width * rect.height * self.SCAN_ZOOM ** 2 * 3 + self.PAGE_OVERHEAD_BYTES
+            size = max(1, int(self.max_memory_mb * 1024 * 1024 // page_bytes))
+        else:
+            return None
+        return size if len(doc) > size else None
 
-    def process(self, input_path, output_path, entities_to_ignore=None, doc_type=None):
+    def process(self, input_path, output_path, entities_to_ignore=None, doc_type=None, raw_pages=None):
         """
         Processes a PDF: detects PII and performs physical redaction.
         Supports both native and scanned PDFs.
@@ -24,77 +54,310 @@ class PDFProcessor:
             logger.error(f"Failed to open PDF {input_path}: {e}", exc_info=True)
             raise
 
+        window = self.window_size(doc) if len(doc) else None
+        if window:
+            page_count = len(doc)
+            metadata = doc.metadata
+            doc.close()
+            return self._process_windows(input_path, output_path, page_count, window, metadata,
+                                         entities_to_ignore=entities_to_ignore, doc_type=doc_type, raw_pages=raw_pages)
+
+        try:
+            audit_results = self._redact_document(doc, entities_to_ignore=entities_to_ignore, doc_type=doc_type, raw_pages=raw_pages)
+
+            # Optimize the output PDF
+            logger.info(f"Saving optimized PDF to {output_path}")
+            with metrics.timer("save", doc_type):
+                doc.save(output_path, **self.SAVE_OPTIONS)
+            logger.info("PDF processing complete")
+        except Exception as e:
+            logger.error(f"Error processing PDF: {e}", exc_info=True)
+            raise
+        finally:
+            doc.close()
+
+        return audit_results
+
+    def process_bytes(self, data, entities_to_ignore=None, doc_type=None, raw_pages=None):
+        """
+        Same as process() but reads the PDF from a bytes-like object and
+        returns (redacted_bytes, audit_results) without touching the disk.
+        """
+        logger.info(f"Starting in-memory PDF processing ({len(data)} bytes)")
+        try:
+            doc = fitz.open(stream=bytes(data), filetype="pdf")
+        except Exception as e:
+            logger.error(f"Failed to open PDF from memory: {e}", exc_info=True)
+            raise
+
+        try:
+            audit_results = self._redact_document(doc, entities_to_ignore=entities_to_ignore, doc_type=doc_type, raw_pages=raw_pages)
+            with metrics.timer("save", doc_type):
+                redacted_bytes = doc.tobytes(**self.SAVE_OPTIONS)
+            logger.info("In-memory PDF processing complete")
+        except Exception as e:
+            logger.error(f"Error processing PDF: {e}", exc_info=True)
+            raise
+        finally:
+            doc.close()
+
+        return redacted_bytes, audit_results
+
+    def analyze(self, input_path, entities_to_ignore=None, doc_type=None):
+        """
+        Detects PII without redacting anything: pages are analyzed (with OCR for
+        scans) and the filtered detections returned with the page count.
+        Nothing is located, rendered or saved.
+        """
+        logger.info(f"Starting PDF analysis: {input_path}")
+        try:
+            doc = fitz.open(input_path)
+        except Exception as e:
+            logger.error(f"Failed to open PDF {input_path}: {e}", exc_info=True)
+            raise
+
+        results = []
+        try:
+            page_count = len(doc)
+            for page_num in range(page_count):
+                page = doc[page_num]
+                text = page.get_text()
+                if text.strip():
+                    raw_detections = [Detection.from_result(res) for res in self.analyzer.analyze_raw(text, doc_type=doc_type)]
+                    page_results = self.analyzer.detection_filter.apply(raw_detections, text, doc_type=doc_type, entities_to_ignore=entities_to_ignore)
+                else:
+                    logger.info(f"Page {page_num+1}: no text found, running OCR")
+                    with metrics.timer("rasterization", doc_type):
+                        pix = rasterize_page(page, self.SCAN_ZOOM)
+                    ocr_text, raw_detections = self.image_redactor.analyze_image(pixmap_to_image(pix), doc_type=doc_type)
+                    pix = None
+                    page_results = self.image_redactor.filter_detections(raw_detections, ocr_text, entities_to_ignore=entities_to_ignore, doc_type=doc_type)
+                results.extend(AuditRecord.from_detection(det) for det in page_results)
+                page = None
+        finally:
+            doc.close()
+
+        logger.info(f"PDF analysis complete: {len(results)} detections on {page_count} pages")
+        return page_count, results
+
+    def _process_windows(self, input_path, output_path, page_count, window, metadata, entities_to_ignore=None, doc_type=None, raw_pages=None):
+        """
+        Redacts the PDF window by window: each page range is copied into a small
+        document, redacted, compacted and appended to the output with an
+        incremental save, so that only one window is held in memory at a time.
+        The outline and the internal links between windows, which copying a
+        page range drops, are restored at the end.
+        The output is written to a temporary file and renamed when complete.
+        """
+        logger.info(f"Processing {page_count} pages in windows of {window}")
+        partial_path = f"{output_path}.part"
+        audit_results = []
+        toc = []
+        cross_window_links = []
+        try:
+            for start in range(0, page_count, window):
+                end = min(start + window, page_count)
+                logger.info(f"Processing PDF pages {start+1}-{end}/{page_count}")
+                part = fitz.open()
+                with fitz.open(input_path) as source:
+                    part.insert_pdf(source, from_page=start, to_page=end - 1)
+                    if start == 0:
+                        toc = source.get_toc(simple=False)
+                    marked_links = mark_cross_window_links(source, part, start, end)
+                try:
+                    audit_results.extend(self._redact_document(part, entities_to_ignore=entities_to_ignore, doc_type=doc_type,
+                                                               raw_pages=raw_pages, page_offset=start, page_count=page_count))
+                    # Links over redacted areas were removed with them, as in a single pass
+                    cross_window_links.extend(take_cross_window_links(part, start, marked_links))
+                    if start == 0:
+                        part.set_metadata(metadata)
+                    with metrics.timer("save", doc_type):
+                        data = part.tobytes(**self.SAVE_OPTIONS)
+                finally:
+                    part.close()
+                    # MuPDF keeps decoded images in its cache (up to 256 MB by default): the pages
+                    # of this window will not be read again, so empty it to keep memory flat
+                    fitz.TOOLS.store_shrink(100)
+
+                with metrics.timer("save", doc_type):
+                    append_pdf_part(partial_path, data, first=start == 0)
+                del data
+
+            if toc or cross_window_links:
+                with metrics.timer("save", doc_type):
+                    restore_navigation(partial_path, toc, cross_window_links)
+            os.replace(partial_path, output_path)
+            logger.info("PDF processing complete")
+        except Exception as e:
+            logger.error(f"Error processing PDF: {e}", exc_info=True)
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+
+        return audit_results
+
+    def _redact_document(self, doc, entities_to_ignore=None, doc_type=None, raw_pages=None, page_offset=0, page_count=None):
+        """
+        Redacts every page of doc in place and returns compact audit records.
+        page_offset and page_count place the pages within the whole document
+        when doc is one window of it.
+        """
         audit_results = []
+        page_count = page_count or len(doc)
 
-        for page_num in range(len(doc)):
-            logger.info(f"Processing PDF page {page_num+1}/{len(doc)}")
-            page = doc[page_num]
+        for index in range(len(doc)):
+            page_num = page_offset + index
+            logger.info(f"Processing PDF page {page_num+1}/{page_count}")
+            page = doc[index]
             text = page.get_text()
 
             if text.strip():
                 logger.debug(f"Page {page_num+1}: native text found")
                 # Native PDF with text
-                results = self.analyzer.analyze(text, doc_type=doc_type)
-
-                # Filter out ignored entities
-                if entities_to_ignore:
-                    results = [res for res in results if res.entity_type not in entities_to_ignore]
+                raw_detections = [Detection.from_result(res) for res in self.analyzer.analyze_raw(text, doc_type=doc_type)]
+                results = self.analyzer.detection_filter.apply(raw_detections, text, doc_type=doc_type, entities_to_ignore=entities_to_ignore)
 
-                audit_results.extend(results)
+                # Raw detections need their geometry too, so that they can be re-rendered later
+                with metrics.timer("search", doc_type):
+                    locate_native_detections(page, text, raw_detections if raw_pages is not None else results)
 
-                for res in results:
-                    target_text = text[res.start:res.end]
-                    if not target_text.strip():
-                        continue
+                if raw_pages is not None:
+                    raw_pages.append({
+                        "page": page_num,
+                        "kind": "native",
+                        "text": text,
+                        "detections": [det.to_dict() for det in raw_detections]
+                    })
 
-                    areas = page.search_for(target_text)
-                    for area in areas:
-                        page.add_redact_annot(area, fill=(0, 0, 0))
+                audit_results.extend(AuditRecord.from_detection(det) for det in results)
 
-                page.apply_redactions()
+                with metrics.timer("redaction", doc_type):
+                    redact_native_page(page, results)
             else:
                 logger.info(f"Page {page_num+1}: no text found, treating as scan")
                 # Scanned PDF or page with no text
                 # We use a reasonable resolution for OCR
-                pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-                img_data = pix.tobytes("png")
-
-                temp_img_in = f"temp_page_{page_num}.png"
-                temp_img_out = f"temp_page_{page_num}_out.png"
-
-                with open(temp_img_in, "wb") as f:
-                    f.write(img_data)
+                with metrics.timer("rasterization", doc_type):
+                    pix = rasterize_page(page, self.SCAN_ZOOM)
 
                 try:
                     # Pass doc_type to redactor (handles handwriting if it's a constat)
-                    results = self.image_redactor.redact(temp_img_in, temp_img_out, entities_to_ignore=entities_to_ignore, doc_type=doc_type)
-                    audit_results.extend(results)
-
-                    # Insert the redacted image back
-                    # We clear existing content first by redacting the whole page
-                    page.add_redact_annot(page.rect)
-                    page.apply_redactions()
-                    page.insert_image(page.rect, filename=temp_img_out)
+                    ocr_text, raw_detections = self.image_redactor.analyze_image(pixmap_to_image(pix), doc_type=doc_type)
+                    if raw_pages is not None:
+                        raw_pages.append({
+                            "page": page_num,
+                            "kind": "scan",
+                            "zoom": self.SCAN_ZOOM,
+                            "text": ocr_text,
+                            "detections": [det.to_dict() for det in raw_detections]
+                        })
+
+                    results = self.image_redactor.filter_detections(raw_detections, ocr_text, entities_to_ignore=entities_to_ignore, doc_type=doc_type)
+                    audit_results.extend(AuditRecord.from_detection(det) for det in results)
+
+                    # OCR boxes are in pixmap pixels: fill them directly on its samples
+                    with metrics.timer("redaction", doc_type):
+                        redact_pixmap(pix, results)
+                    replace_page_with_pixmap(page, pix)
                 except Exception as e:
+                    # A page that could not be analyzed must not be written out unredacted
                     logger.error(f"Error during scanned page {page_num+1} processing: {e}", exc_info=True)
+                    raise
                 finally:
-                    if os.path.exists(temp_img_in): os.remove(temp_img_in)
-                    if os.path.exists(temp_img_out): os.remove(temp_img_out)
-
-        # Optimize the output PDF
-        try:
-            logger.info(f"Saving optimized PDF to {output_path}")
-            doc.save(
-                output_path,
-                garbage=4,
-                deflate=True,
-                clean=True
-            )
-            logger.info("PDF processing complete")
-        except Exception as e:
-            logger.error(f"Error saving PDF: {e}", exc_info=True)
-            raise
-        finally:
-            doc.close()
+                    # The page bitmap is the largest allocation: drop it before the next page
+                    pix = None
+            page = None
 
         return audit_results
+
+def locate_native_detections(page, text, detections):
+    """Fills detection boxes with the page areas where the detected text appears."""
+    areas_by_text = {}
+    for det in detections:
+        target_text = text[det.start:det.end]
+        if not target_text.strip():
+            continue
+        if target_text not in areas_by_text:
+            areas_by_text[target_text] = [[area.x0, area.y0, area.x1, area.y1] for area in page.search_for(target_text)]
+        det.boxes = areas_by_text[target_text]
+
+def append_pdf_part(output_path, data, first=False):
+    """
+    Writes the first part as the output file, then appends the pages of each
+    following part with an incremental save. Parts are already redacted and
+    compacted, so no earlier revision holds unredacted content.
+    """
+    if first:
+        with open(output_path, 'wb') as f:
+            f.write(data)
+        return
+    with fitz.open(stream=data, filetype="pdf") as part, fitz.open(output_path) as output:
+        output.insert_pdf(part)
+        output.saveIncr()
+
+def mark_cross_window_links(source, part, start, end):
+    """
+    Copying pages start..end-1 into part drops their internal links to other
+    pages: they are added back to part as placeholder URI links, so that
+    redaction removes the ones it covers. Returns the original links, indexed
+    by the placeholders.
+    """
+    links = []
+    for index in range(end - start):
+        page = part[index]
+        for link in source[start + index].get_links():
+            if link["kind"] == fitz.LINK_GOTO and not start <= link["page"] < end:
+                page.insert_link({"kind": fitz.LINK_URI, "from": link["from"], "uri": f"{CROSS_WINDOW_URI}{len(links)}"})
+                links.append(link)
+    return links
+
+def take_cross_window_links(part, start, marked_links):
+    """Removes the placeholders left after redaction and returns their (page number, original link)."""
+    kept = []
+    for index in range(len(part)):
+        page = part[index]
+        for link in page.get_links():
+            if link["kind"] == fitz.LINK_URI and link["uri"].startswith(CROSS_WINDOW_URI):
+                kept.append((start + index, marked_links[int(link["uri"][len(CROSS_WINDOW_URI):])]))
+                page.delete_link(link)
+    return kept
+
+def restore_navigation(output_path, toc, links):
+    """Restores the outline and the internal links between windows on the assembled output."""
+    with fitz.open(output_path) as output:
+        for page_num, link in links:
+            output[page_num].insert_link({key: link[key] for key in ("kind", "from", "page", "to", "zoom") if key in link})
+        if toc:
+            output.set_toc(toc)
+        output.saveIncr()
+
+def redact_native_page(page, detections):
+    """Physically removes the content under every detection box of a native page."""
+    for det in detections:
+        for box in det.boxes:
+            page.add_redact_annot(fitz.Rect(box), fill=(0, 0, 0))
+    page.apply_redactions()
+
+def rasterize_page(page, zoom):
+    return page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+
+def pixmap_to_image(pix):
+    """PIL view of the pixmap for OCR, without PNG encoding."""
+    mode = {1: "L", 3: "RGB", 4: "RGBA"}[pix.n]
+    return Image.frombuffer(mode, (pix.width, pix.height), pix.samples_mv, "raw", mode, pix.stride, 1)
+
+def pixmap_pixels(pix):
+    """Writable (height, width, channels) numpy view on the pixmap samples."""
+    return np.ndarray((pix.height, pix.width, pix.n), dtype=np.uint8, buffer=pix.samples_mv, strides=(pix.stride, pix.n, 1))
+
+def redact_pixmap(pix, detections):
+    """Blackens the detections in place on the pixmap, one rectangle per line."""
+    fill_boxes(pixmap_pixels(pix), detection_rectangles(detections), alpha=bool(pix.alpha))
+    return pix
+
+def replace_page_with_pixmap(page, pix):
+    """Replaces the whole page content with the (redacted) pixmap."""
+    # We clear existing content first by redacting the whole page
+    page.add_redact_annot(page.rect)
+    page.apply_redactions()
+    page.insert_image(page.rect, pixmap=pix)
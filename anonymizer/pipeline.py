@@ -4,35 +4,52 @@ from .analyzer import FrenchAnalyzer
 from .redactor import FrenchImageRedactor
 from .pdf_processor import PDFProcessor
 from .utils import AuditLogger
+from .refilter import RawDetectionStore
+from .metrics import metrics
+from PIL import Image
 import fitz
+import time
 
 logger = logging.getLogger(__name__)
 
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.tiff', '.bmp']
+
+def is_supported(path):
+    """True for the file formats the pipeline can anonymize (images and PDF)."""
+    ext = os.path.splitext(path)[1].lower()
+    return ext in IMAGE_EXTENSIONS or ext == '.pdf'
+
 class AnonymizationPipeline:
-    def __init__(self, output_dir, custom_recognizers=None, allow_lists=None, entities_to_ignore=None, default_doc_type=None):
+    def __init__(self, output_dir, custom_recognizers=None, allow_lists=None, entities_to_ignore=None, default_doc_type=None, raw_dir=None, audit_logger=None, page_window=None, max_pdf_memory_mb=None):
         logger.info("Initializing AnonymizationPipeline...")
         try:
             self.analyzer = FrenchAnalyzer(custom_recognizers_path=custom_recognizers, allow_lists_path=allow_lists)
             logger.info("FrenchAnalyzer initialized")
             self.image_redactor = FrenchImageRedactor(self.analyzer)
             logger.info("FrenchImageRedactor initialized")
-            self.pdf_processor = PDFProcessor(self.analyzer, self.image_redactor)
+            self.pdf_processor = PDFProcessor(self.analyzer, self.image_redactor, page_window=page_window, max_memory_mb=max_pdf_memory_mb)
             logger.info("PDFProcessor initialized")
-            self.logger = AuditLogger(output_dir)
+            # Audit backend: per-file JSON unless another one (e.g. SQLiteAuditLogger) is given
+            self.logger = audit_logger or AuditLogger(output_dir)
             self.output_dir = output_dir
             self.entities_to_ignore = entities_to_ignore or ["DATE_TIME", "CARDINAL"]
             self.default_doc_type = default_doc_type
+            # Optional store of raw detections, used to refilter without re-analysis
+            self.raw_store = RawDetectionStore(raw_dir) if raw_dir else None
             logger.info(f"Pipeline ready. Entities to ignore: {self.entities_to_ignore}")
         except Exception as e:
             logger.error(f"Error initializing pipeline: {e}", exc_info=True)
             raise
 
-    def _extract_sample_text(self, file_path):
+    def _extract_sample_text(self, file_path, data=None):
         """Extract a sample of text to help identify the document type."""
         ext = os.path.splitext(file_path)[1].lower()
         if ext == '.pdf':
             try:
-                doc = fitz.open(file_path)
+                if data is not None:
+                    doc = fitz.open(stream=bytes(data), filetype="pdf")
+                else:
+                    doc = fitz.open(file_path)
                 text = ""
                 for i in range(min(2, len(doc))):
                     text += doc[i].get_text()
@@ -44,34 +61,123 @@ class AnonymizationPipeline:
                 return ""
         return ""
 
+    def _detect_doc_type(self, file_path, manual_doc_type=None, data=None):
+        """Resolves the document type; both stages are timed under the resulting type."""
+        start = time.perf_counter()
+        sample_text = self._extract_sample_text(file_path, data=data)
+        extraction_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        doc_type = manual_doc_type or self.default_doc_type or self.analyzer.detect_doc_type(sample_text, os.path.basename(file_path))
+        detection_time = time.perf_counter() - start
+
+        metrics.observe("sample_extraction", extraction_time, doc_type)
+        metrics.observe("type_detection", detection_time, doc_type)
+        return doc_type
+
     def process_file(self, file_path, manual_doc_type=None):
         filename = os.path.basename(file_path)
         ext = os.path.splitext(filename)[1].lower()
-        
+
         # Skip files without extension
         if not ext:
             print(f"Skipping {filename} (no file extension)")
             return None
-        
+
         output_path = os.path.join(self.output_dir, filename)
 
-        sample_text = self._extract_sample_text(file_path)
-        doc_type = manual_doc_type or self.default_doc_type or self.analyzer.detect_doc_type(sample_text, filename)
+        doc_type = self._detect_doc_type(file_path, manual_doc_type)
 
         if doc_type:
             print(f"Processing {filename} as type: {doc_type}...")
         else:
             print(f"Processing {filename} (unknown type)...")
 
-        results = []
-        if ext in ['.jpg', '.jpeg', '.png', '.tiff', '.bmp']:
-            results = self.image_redactor.redact(file_path, output_path, entities_to_ignore=self.entities_to_ignore, doc_type=doc_type)
-        elif ext == '.pdf':
-            results = self.pdf_processor.process(file_path, output_path, entities_to_ignore=self.entities_to_ignore, doc_type=doc_type)
-        else:
+        if ext not in IMAGE_EXTENSIONS and ext != '.pdf':
             print(f"Unsupported file format: {ext}")
             return None
 
-        audit_path = self.logger.log_process(filename, results)
+        raw_pages = [] if self.raw_store else None
+        with metrics.doc_type(doc_type), metrics.timer("total"):
+            if ext in IMAGE_EXTENSIONS:
+                results = self.image_redactor.redact(file_path, output_path, entities_to_ignore=self.entities_to_ignore, doc_type=doc_type, raw_pages=raw_pages)
+            else:
+                results = self.pdf_processor.process(file_path, output_path, entities_to_ignore=self.entities_to_ignore, doc_type=doc_type, raw_pages=raw_pages)
+
+        if self.raw_store:
+            self.raw_store.save(file_path, doc_type, raw_pages)
+
+        audit_path = self.logger.log_process(filename, results, doc_type=doc_type)
         print(f"Finished processing {filename}. Audit log: {audit_path}")
         return output_path
+
+    def analyze_file(self, file_path, manual_doc_type=None):
+        """
+        Triage: detects the type and the PII of a document without anonymizing
+        it. Nothing is redacted, rendered or written. Returns a summary dict
+        (see summarize_detections), or None if the format is unsupported.
+        """
+        filename = os.path.basename(file_path)
+        ext = os.path.splitext(filename)[1].lower()
+
+        if ext not in IMAGE_EXTENSIONS and ext != '.pdf':
+            logger.warning(f"Skipping {filename} (unsupported format: {ext or 'no extension'})")
+            return None
+
+        doc_type = self._detect_doc_type(file_path, manual_doc_type)
+        logger.info(f"Analyzing {filename} as type: {doc_type}")
+
+        with metrics.doc_type(doc_type), metrics.timer("total"):
+            if ext in IMAGE_EXTENSIONS:
+                pages = 1
+                results = self.image_redactor.analyze(file_path, entities_to_ignore=self.entities_to_ignore, doc_type=doc_type)
+            else:
+                pages, results = self.pdf_processor.analyze(file_path, entities_to_ignore=self.entities_to_ignore, doc_type=doc_type)
+
+        return summarize_detections(filename, doc_type, pages, results)
+
+    def process_bytes(self, data, filename_hint, doc_type=None):
+        """
+        Anonymizes a document held in memory (bytes, bytearray or memoryview).
+        filename_hint is only used for its extension and for type detection.
+        Returns (redacted_bytes, audit_data), or None if the format is unsupported.
+        Nothing is written to disk.
+        """
+        filename = os.path.basename(filename_hint)
+        ext = os.path.splitext(filename)[1].lower()
+
+        if not ext:
+            logger.warning(f"Skipping {filename} (no file extension)")
+            return None
+
+        if ext not in IMAGE_EXTENSIONS and ext != '.pdf':
+            logger.warning(f"Unsupported file format: {ext}")
+            return None
+
+        doc_type = self._detect_doc_type(filename, doc_type, data=data)
+        logger.info(f"Processing {filename} in memory as type: {doc_type}")
+
+        with metrics.doc_type(doc_type), metrics.timer("total"):
+            if ext in IMAGE_EXTENSIONS:
+                image_format = Image.registered_extensions().get(ext)
+                redacted_bytes, results = self.image_redactor.redact_bytes(data, image_format, entities_to_ignore=self.entities_to_ignore, doc_type=doc_type)
+            else:
+                redacted_bytes, results = self.pdf_processor.process_bytes(data, entities_to_ignore=self.entities_to_ignore, doc_type=doc_type)
+
+        audit_data = self.logger.build_audit(filename, results)
+        logger.info(f"Finished processing {filename} in memory: {len(audit_data['detections'])} detections")
+        return redacted_bytes, audit_data
+
+def summarize_detections(filename, doc_type, pages, results):
+    """Compact PII summary of a document: detection count per entity type, without any detected text."""
+    entities = {}
+    for res in results:
+        entities[res.entity_type] = entities.get(res.entity_type, 0) + 1
+    return {
+        "filename": filename,
+        "doc_type": doc_type,
+        "pages": pages,
+        "detections": len(results),
+        "entities": dict(sorted(entities.items(), key=lambda item: (-item[1], item[0]))),
+        "max_score": max((res.score for res in results), default=None)
+    }
@@ -1,17 +1,26 @@
-from presidio_image_redactor import ImageRedactorEngine, ImageAnalyzerEngine
+from presidio_image_redactor import ImageAnalyzerEngine
 from PIL import Image
+from .detections import group_image_results, redact_image
+from .image_processing import ocr_quality, estimate_orientation, rotate_image, map_boxes_to_original
+from .metrics import metrics
 import io
 import logging
 
 logger = logging.getLogger(__name__)
 
 class FrenchImageRedactor:
+    # A first OCR pass below these is retried once on a reoriented, deskewed image
+    MIN_OCR_CONFIDENCE = 50
+    MIN_OCR_WORDS = 5
+    # Smaller corrections are left to Tesseract
+    MIN_ROTATION = 1.0
+
     def __init__(self, french_analyzer):
         self.french_analyzer = french_analyzer
         self.analyzer_engine = ImageAnalyzerEngine(analyzer_engine=french_analyzer.engine)
-        self.image_redactor_engine = ImageRedactorEngine(image_analyzer_engine=self.analyzer_engine)
+        metrics.instrument(self.analyzer_engine.ocr, "perform_ocr", "ocr")
 
-    def redact(self, image_path, output_path, entities_to_ignore=None, doc_type=None):
+    def redact(self, image_path, output_path, entities_to_ignore=None, doc_type=None, raw_pages=None):
         logger.info(f"Starting image redaction: {image_path}")
         try:
             image = Image.open(image_path)
@@ -20,88 +29,139 @@ class FrenchImageRedactor:
             logger.error(f"Failed to open image {image_path}: {e}", exc_info=True)
             raise
 
-        # 1. Get allow list
+        redacted_image, filtered_results = self.redact_image(image, entities_to_ignore=entities_to_ignore, doc_type=doc_type, raw_pages=raw_pages)
+
         try:
-            allow_list = self.french_analyzer.get_allow_list(doc_type)
-            logger.debug(f"Allow list for doc_type '{doc_type}': {len(allow_list)} items")
+            with metrics.timer("save", doc_type):
+                redacted_image.save(output_path)
+            logger.info(f"Redacted image saved: {output_path}")
         except Exception as e:
-            logger.error(f"Failed to get allow list: {e}", exc_info=True)
+            logger.error(f"Error saving redacted image: {e}", exc_info=True)
             raise
 
-        # 2. Prepare extended allow list (case-insensitive versions)
-        extended_allow_list = set()
-        for term in allow_list:
-            extended_allow_list.add(term)
-            extended_allow_list.add(term.lower())
-            extended_allow_list.add(term.upper())
-            extended_allow_list.add(term.capitalize())
+        return filtered_results
 
-        # 3. Analyze for audit logging
+    def analyze(self, image_path, entities_to_ignore=None, doc_type=None):
+        """Runs OCR and analysis on an image file and returns the filtered detections, without redacting it."""
+        logger.info(f"Starting image analysis only: {image_path}")
         try:
-            logger.info("Starting image analysis...")
-            # ImageAnalyzerEngine.analyze() may not support all parameters
-            # Try with minimal parameters first
-            analysis_results = self.analyzer_engine.analyze(image, language="fr")
-            logger.info(f"Image analysis completed. Found {len(analysis_results)} entities")
+            image = Image.open(image_path)
         except Exception as e:
-            logger.error(f"Error during image analysis: {e}", exc_info=True)
-            analysis_results = []
-
-        # 4. Filter out ignored entities and allow-listed items
-        filtered_results = []
-        ignored_count = 0
-        allow_listed_count = 0
-        duplicate_count = 0
-        
-        # Track seen entities to avoid duplicates (same location)
-        seen_locations = set()
-        
-        for res in analysis_results:
-            # Skip ignored entity types
-            if entities_to_ignore and res.entity_type in entities_to_ignore:
-                ignored_count += 1
-                logger.debug(f"Ignored entity (type): {res.entity_type}")
-                continue
-            
-            # Deduplicate: skip if we've already seen an entity at this exact location
-            location_key = (res.start, res.end, res.entity_type)
-            if location_key in seen_locations:
-                duplicate_count += 1
-                logger.debug(f"Duplicate entity at location {res.start}-{res.end}: {res.entity_type}")
-                continue
-            seen_locations.add(location_key)
-            
-            # Get the text value from the result (could be 'value' or 'text' depending on result type)
-            text_value = getattr(res, 'value', getattr(res, 'text', ''))
-            
-            # Skip items in the allow list (case-insensitive)
-            if text_value and (text_value in extended_allow_list or text_value.lower() in {t.lower() for t in extended_allow_list}):
-                allow_listed_count += 1
-                logger.debug(f"Ignored entity (allow-list): {text_value}")
-                continue
-            
-            filtered_results.append(res)
-        
-        logger.info(f"Filtered results: {len(filtered_results)} to redact, {ignored_count} ignored by type, {allow_listed_count} ignored by allow-list, {duplicate_count} duplicates")
-
-        # 5. Redact the image
+            logger.error(f"Failed to open image {image_path}: {e}", exc_info=True)
+            raise
+
+        text, raw_detections = self.analyze_image(image, doc_type=doc_type)
+        return self.filter_detections(raw_detections, text, entities_to_ignore=entities_to_ignore, doc_type=doc_type)
+
+    def redact_bytes(self, data, image_format, entities_to_ignore=None, doc_type=None, raw_pages=None):
+        """Redacts an encoded image held in memory and returns (redacted_bytes, results)."""
         try:
-            logger.info("Starting image redaction...")
-            redacted_image = self.image_redactor_engine.redact(
-                image, 
-                fill=(0, 0, 0)
-            )
-            logger.info("Image redaction completed")
+            image = Image.open(io.BytesIO(data))
+            logger.debug(f"Image opened from memory: {image.size}, {image.format}")
         except Exception as e:
-            logger.error(f"Error during image redaction: {e}", exc_info=True)
+            logger.error(f"Failed to open image from memory: {e}", exc_info=True)
             raise
 
+        redacted_image, filtered_results = self.redact_image(image, entities_to_ignore=entities_to_ignore, doc_type=doc_type, raw_pages=raw_pages)
+
+        buffer = io.BytesIO()
         try:
-            redacted_image.save(output_path)
-            logger.info(f"Redacted image saved: {output_path}")
+            with metrics.timer("save", doc_type):
+                redacted_image.save(buffer, format=image_format or image.format or "PNG")
         except Exception as e:
-            logger.error(f"Error saving redacted image: {e}", exc_info=True)
+            logger.error(f"Error encoding redacted image: {e}", exc_info=True)
+            raise
+
+        return buffer.getvalue(), filtered_results
+
+    def redact_image(self, image, entities_to_ignore=None, doc_type=None, raw_pages=None):
+        """
+        Redacts a PIL image and returns (redacted_image, filtered_results).
+        If raw_pages is a list, the OCR text and raw detections are appended to it.
+        """
+        text, raw_detections = self.analyze_image(image, doc_type=doc_type)
+        if raw_pages is not None:
+            raw_pages.append({
+                "page": 0,
+                "kind": "image",
+                "text": text,
+                "detections": [det.to_dict() for det in raw_detections]
+            })
+
+        filtered_results = self.filter_detections(raw_detections, text, entities_to_ignore=entities_to_ignore, doc_type=doc_type)
+        return self.render(image, filtered_results, doc_type=doc_type), filtered_results
+
+    def analyze_image(self, image, doc_type=None):
+        """
+        Runs OCR and PII analysis on the image, without any filtering.
+        Returns (ocr_text, detections) where each detection carries its word boxes.
+        OCR and analysis errors are raised.
+        """
+        try:
+            logger.info("Starting image analysis...")
+            with metrics.timer("image_analysis", doc_type):
+                preprocessed_image, preprocessing_metadata = self.analyzer_engine.image_preprocessor.preprocess_image(image)
+                ocr_result = self.perform_ocr(preprocessed_image, doc_type=doc_type)
+                ocr_result = self.analyzer_engine.remove_space_boxes(ocr_result)
+                if preprocessing_metadata and "scale_factor" in preprocessing_metadata:
+                    ocr_result = self.analyzer_engine._scale_bbox_results(ocr_result, preprocessing_metadata["scale_factor"])
+
+                text = self.analyzer_engine.ocr.get_text_from_ocr_dict(ocr_result)
+                results = self.french_analyzer.analyze_raw(text, doc_type=doc_type)
+                image_results = self.analyzer_engine.map_analyzer_results_to_bounding_boxes(results, ocr_result, text, [])
+            detections = group_image_results(image_results)
+            logger.info(f"Image analysis completed. Found {len(detections)} entities")
+            return text, detections
+        except Exception as e:
+            # Failing loudly: an empty result would let the image be written unredacted
+            logger.error(f"Error during image analysis: {e}", exc_info=True)
             raise
-        
+
+    def perform_ocr(self, image, doc_type=None):
+        """
+        OCRs the image. Pages whose first pass has a low mean word confidence or
+        too few words (rotated or skewed scans) get a cheap orientation and skew
+        estimate and, if needed, one more pass on the corrected image; its boxes
+        are mapped back to the original image. The better of the two passes wins.
+        """
+        ocr = self.analyzer_engine.ocr
+        ocr_result = ocr.perform_ocr(image)
+        word_count, confidence = ocr_quality(ocr_result)
+        if word_count >= self.MIN_OCR_WORDS and confidence >= self.MIN_OCR_CONFIDENCE:
+            return ocr_result
+
+        with metrics.timer("orientation", doc_type):
+            angle = estimate_orientation(image)
+        if abs(angle) < self.MIN_ROTATION:
+            logger.debug(f"Low OCR quality ({word_count} words, confidence {confidence:.0f}) but no rotation found")
+            return ocr_result
+
+        logger.info(f"Low OCR quality ({word_count} words, confidence {confidence:.0f}): retrying rotated by {angle:.1f} degrees")
+        rotated = rotate_image(image, angle)
+        retry_result = ocr.perform_ocr(rotated)
+        retry_count, retry_confidence = ocr_quality(retry_result)
+        if retry_count * retry_confidence <= word_count * confidence:
+            logger.info("Rotated OCR pass did not improve the result, keeping the first pass")
+            return ocr_result
+
+        logger.info(f"Rotated OCR pass kept: {retry_count} words, confidence {retry_confidence:.0f}")
+        return map_boxes_to_original(retry_result, angle, rotated.size, image.size)
+
+    def filter_detections(self, detections, text, entities_to_ignore=None, doc_type=None):
+        """Applies ignored entity types, allow lists and doc_type thresholds to raw detections."""
+        filtered_results = self.french_analyzer.detection_filter.apply(detections, text, doc_type=doc_type, entities_to_ignore=entities_to_ignore)
+        logger.info(f"Filtered results: {len(filtered_results)} to redact, {len(detections) - len(filtered_results)} filtered out")
         return filtered_results
 
+    def render(self, image, detections, doc_type=None):
+        """Returns a copy of the image with the given detections filled, one rectangle per line."""
+        try:
+            logger.info("Starting image redaction...")
+            with metrics.timer("redaction", doc_type):
+                redacted_image = redact_image(image, detections)
+            logger.info("Image redaction completed")
+        except Exception as e:
+            logger.error(f"Error during image redaction: {e}", exc_info=True)
+            raise
+
+        return redacted_image
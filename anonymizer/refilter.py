@@ -0,0 +1,119 @@
+import json
+import os
+from datetime import datetime
+import fitz  # PyMuPDF
+from PIL import Image
+from .detections import Detection, redact_image
+from .utils import file_sha256
+from .pdf_processor import PDFProcessor, redact_native_page, rasterize_page, redact_pixmap, replace_page_with_pixmap
+import logging
+
+logger = logging.getLogger(__name__)
+
+class RawDetectionStore:
+    """
+    Persists the raw (pre-filter) detections of each document with their
+    geometry and the extracted/OCR text, one JSON file per document.
+    These files contain the detected PII in clear text and must be protected
+    like the original documents.
+    """
+
+    def __init__(self, raw_dir):
+        self.raw_dir = raw_dir
+        os.makedirs(raw_dir, exist_ok=True)
+
+    def path_for(self, filename):
+        return os.path.join(self.raw_dir, f"{os.path.splitext(filename)[0]}_raw.json")
+
+    def save(self, source_path, doc_type, pages):
+        record = {
+            "filename": os.path.basename(source_path),
+            "source_path": os.path.abspath(source_path),
+            "source_sha256": file_sha256(source_path),
+            "doc_type": doc_type,
+            "timestamp": datetime.now().isoformat(),
+            "pages": pages
+        }
+        raw_path = self.path_for(record["filename"])
+        with open(raw_path, 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False)
+        logger.debug(f"Raw detections saved: {raw_path}")
+        return raw_path
+
+    def load(self, raw_path):
+        with open(raw_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def iter_records(self):
+        for name in sorted(os.listdir(self.raw_dir)):
+            if name.endswith("_raw.json"):
+                yield os.path.join(self.raw_dir, name)
+
+class Refilterer:
+    """
+    Re-applies a filter configuration (allow lists, doc_type thresholds,
+    ignored entities) to stored raw detections and re-renders the redacted
+    output from the original file, without running OCR or NER again.
+    """
+
+    def __init__(self, detection_filter, output_dir, audit_logger, entities_to_ignore=None):
+        self.detection_filter = detection_filter
+        self.output_dir = output_dir
+        self.audit_logger = audit_logger
+        self.entities_to_ignore = entities_to_ignore or []
+
+    def refilter(self, record, doc_type=None):
+        filename = record["filename"]
+        source_path = record["source_path"]
+        if not os.path.exists(source_path):
+            logger.warning(f"Source file of {filename} not found: {source_path}")
+            return None
+        if file_sha256(source_path) != record["source_sha256"]:
+            logger.warning(f"Source file of {filename} changed since analysis, skipping: {source_path}")
+            return None
+
+        doc_type = doc_type or record.get("doc_type")
+        output_path = os.path.join(self.output_dir, filename)
+        pages = {page["page"]: page for page in record["pages"]}
+
+        if os.path.splitext(filename)[1].lower() == '.pdf':
+            results = self._refilter_pdf(source_path, output_path, pages, doc_type)
+        else:
+            results = self._refilter_image(source_path, output_path, pages[0], doc_type)
+
+        self.audit_logger.log_process(filename, results, doc_type=doc_type)
+        logger.info(f"Refiltered {filename}: {len(results)} detections kept")
+        return output_path
+
+    def _filter_page(self, page, doc_type):
+        detections = [Detection.from_dict(data) for data in page["detections"]]
+        return self.detection_filter.apply(detections, page["text"], doc_type=doc_type, entities_to_ignore=self.entities_to_ignore)
+
+    def _refilter_image(self, source_path, output_path, page, doc_type):
+        results = self._filter_page(page, doc_type)
+        image = Image.open(source_path)
+        redact_image(image, results).save(output_path)
+        return results
+
+    def _refilter_pdf(self, source_path, output_path, pages, doc_type):
+        audit_results = []
+        doc = fitz.open(source_path)
+        try:
+            for page_num in range(len(doc)):
+                page_record = pages.get(page_num)
+                if page_record is None:
+                    continue
+                page = doc[page_num]
+                results = self._filter_page(page_record, doc_type)
+                audit_results.extend(results)
+
+                if page_record["kind"] == "native":
+                    redact_native_page(page, results)
+                else:
+                    pix = rasterize_page(page, page_record.get("zoom", PDFProcessor.SCAN_ZOOM))
+                    replace_page_with_pixmap(page, redact_pixmap(pix, results))
+
+            doc.save(output_path, **PDFProcessor.SAVE_OPTIONS)
+        finally:
+            doc.close()
+        return audit_results
@@ -1,12 +1,20 @@
+import hashlib
 import json
 import os
+import sqlite3
+import threading
 from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
 
 class AuditLogger:
+    """Default audit backend: one pretty-printed JSON file per document in the output folder."""
+
     def __init__(self, output_dir):
         self.output_dir = output_dir
 
-    def log_process(self, filename, results):
+    def build_audit(self, filename, results):
         audit_data = {
             "filename": filename,
             "timestamp": datetime.now().isoformat(),
@@ -21,10 +29,192 @@ class AuditLogger:
                 "score": res.score
             })
 
-        audit_filename = f"{os.path.splitext(filename)[0]}_audit.json"
-        audit_path = os.path.join(self.output_dir, audit_filename)
+        return audit_data
+
+    def log_process(self, filename, results, doc_type=None):
+        audit_data = self.build_audit(filename, results)
+        return write_audit_json(self.output_dir, audit_data)
+
+    def on_stored(self, callback):
+        """Calls callback once the entries logged so far are stored: right away for JSON files."""
+        callback()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def write_audit_json(output_dir, audit_data):
+    audit_filename = f"{os.path.splitext(audit_data['filename'])[0]}_audit.json"
+    audit_path = os.path.join(output_dir, audit_filename)
+
+    with open(audit_path, 'w', encoding='utf-8') as f:
+        json.dump(audit_data, f, indent=4, ensure_ascii=False)
+
+    return audit_path
+
+class SQLiteAuditLogger(AuditLogger):
+    """
+    Audit backend storing every document and detection in one indexed SQLite
+    database. Entries are buffered and inserted in batches, one transaction per
+    batch. WAL mode and a busy timeout let several worker processes write to
+    the same database; each process opens its own connection.
+    """
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS documents (id INTEGER PRIMARY KEY, filename TEXT NOT NULL, doc_type TEXT, timestamp TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS detections (document_id INTEGER NOT NULL REFERENCES documents(id), entity_type TEXT NOT NULL, start INTEGER, end INTEGER, score REAL)",
+        "CREATE INDEX IF NOT EXISTS idx_documents_filename ON documents(filename)",
+        "CREATE INDEX IF NOT EXISTS idx_documents_doc_type ON documents(doc_type)",
+        "CREATE INDEX IF NOT EXISTS idx_documents_timestamp ON documents(timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_detections_entity_type ON detections(entity_type, document_id)",
+        "CREATE INDEX IF NOT EXISTS idx_detections_document ON detections(document_id)"
+    ]
+
+    def __init__(self, db_path, batch_size=100, timeout=30.0):
+        self.output_dir = os.path.dirname(os.path.abspath(db_path))
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self._pending = []
+        self._on_stored = []
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+
+    def _connect(self):
+        # A connection must not be shared with forked worker processes
+        if self._connection is None or self._pid != os.getpid():
+            connection = sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+            for statement in self.SCHEMA:
+                connection.execute(statement)
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def log_process(self, filename, results, doc_type=None):
+        audit_data = self.build_audit(filename, results)
+        with self._lock:
+            self._pending.append((audit_data, doc_type))
+            should_flush = len(self._pending) >= self.batch_size
+        if should_flush:
+            self.flush()
+        return self.db_path
+
+    def on_stored(self, callback):
+        """Calls callback once the entries logged so far are committed, after the batch holding them is flushed."""
+        with self._lock:
+            if self._pending:
+                self._on_stored.append(callback)
+                return
+        callback()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+            callbacks, self._on_stored = self._on_stored, []
+            if not pending:
+                return
+            in_transaction = False
+            try:
+                connection = self._connect()
+                connection.execute("BEGIN IMMEDIATE")
+                in_transaction = True
+                for audit_data, doc_type in pending:
+                    cursor = connection.execute(
+                        "INSERT INTO documents (filename, doc_type, timestamp) VALUES (?, ?, ?)",
+                        (audit_data["filename"], doc_type, audit_data["timestamp"])
+                    )
+                    connection.executemany(
+                        "INSERT INTO detections (document_id, entity_type, start, end, score) VALUES (?, ?, ?, ?, ?)",
+                        [(cursor.lastrowid, d["entity_type"], d["start"], d["end"], d["score"]) for d in audit_data["detections"]]
+                    )
+                connection.execute("COMMIT")
+            except Exception:
+                # Kept for the next flush: a locked or unreachable database must not lose the batch
+                if in_transaction:
+                    connection.execute("ROLLBACK")
+                self._pending = pending + self._pending
+                self._on_stored = callbacks + self._on_stored
+                raise
+        logger.debug(f"Flushed {len(pending)} audit entries to {self.db_path}")
+        for callback in callbacks:
+            callback()
+
+    def close(self):
+        self.flush()
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+
+    def find_documents(self, entity_type=None, doc_type=None, since=None, until=None):
+        """
+        Returns (filename, doc_type, timestamp) of the documents matching all given criteria.
+        since/until are ISO timestamps (or dates), compared as strings.
+        """
+        self.flush()
+        query = "SELECT d.filename, d.doc_type, d.timestamp FROM documents d WHERE 1=1"
+        params = []
+        if entity_type:
+            query += " AND EXISTS (SELECT 1 FROM detections x WHERE x.document_id = d.id AND x.entity_type = ?)"
+            params.append(entity_type)
+        if doc_type:
+            query += " AND d.doc_type = ?"
+            params.append(doc_type)
+        if since:
+            query += " AND d.timestamp >= ?"
+            params.append(since)
+        if until:
+            query += " AND d.timestamp < ?"
+            params.append(until)
+        query += " ORDER BY d.timestamp"
+        return self._connect().execute(query, params).fetchall()
+
+    def iter_audits(self):
+        """Yields the latest audit of each filename, in the JSON audit format."""
+        self.flush()
+        connection = self._connect()
+        documents = connection.execute(
+            "SELECT id, filename, timestamp FROM documents WHERE id IN (SELECT MAX(id) FROM documents GROUP BY filename) ORDER BY filename"
+        ).fetchall()
+        for document_id, filename, timestamp in documents:
+            detections = connection.execute(
+                "SELECT entity_type, start, end, score FROM detections WHERE document_id = ? ORDER BY rowid",
+                (document_id,)
+            ).fetchall()
+            yield {
+                "filename": filename,
+                "timestamp": timestamp,
+                "detections": [
+                    {"entity_type": entity_type, "start": start, "end": end, "score": score}
+                    for entity_type, start, end, score in detections
+                ]
+            }
 
-        with open(audit_path, 'w', encoding='utf-8') as f:
-            json.dump(audit_data, f, indent=4, ensure_ascii=False)
+    def export_json(self, output_dir):
+        """Regenerates one <name>_audit.json file per document. Returns the number written."""
+        os.makedirs(output_dir, exist_ok=True)
+        count = 0
+        for audit_data in self.iter_audits():
+            write_audit_json(output_dir, audit_data)
+            count += 1
+        logger.info(f"Exported {count} audit files to {output_dir}")
+        return count
 
-        return audit_path
+def create_audit_logger(backend, output_dir, db_path=None, batch_size=100):
+    """Returns the audit backend named `backend` ("json" or "sqlite")."""
+    if backend == "json":
+        return AuditLogger(output_dir)
+    if backend == "sqlite":
+        return SQLiteAuditLogger(db_path or os.path.join(output_dir, "audit.db"), batch_size=batch_size)
+    raise ValueError(f"Unknown audit backend: {backend}")
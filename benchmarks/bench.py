@@ -0,0 +1,213 @@
+"""
+Offline throughput benchmark for AnonymizationPipeline.
+
+Generates a deterministic synthetic corpus, runs every document end to end,
+and reports docs/s, pages/s, p50/p95 latency, peak RSS and per-stage timings.
+Results can be stored as a baseline and compared against on later runs.
+Timings only compare on the same machine: no baseline is committed, record
+one per machine before comparing.
+
+    python -m benchmarks.bench --save-baseline
+    python -m benchmarks.bench --baseline benchmarks/baseline.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from anonymizer.metrics import metrics
+from anonymizer.pipeline import AnonymizationPipeline
+from .corpus import generate_corpus, DOC_TEMPLATES, LAYOUTS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Metrics compared against the baseline: name -> True if higher is better
+COMPARED_METRICS = {
+    "docs_per_sec": True,
+    "pages_per_sec": True,
+    "p50_latency": False,
+    "p95_latency": False,
+    "peak_rss_mb": False
+}
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100.0 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def environment():
+    """Where a report was recorded: comparing timings from different machines is meaningless."""
+    return {
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version()
+    }
+
+def _latency_summary(latencies):
+    return {
+        "docs": len(latencies),
+        "p50_latency": round(percentile(latencies, 50), 4),
+        "p95_latency": round(percentile(latencies, 95), 4)
+    }
+
+def run_benchmark(pipeline, manifest):
+    """Runs every document of the manifest through the pipeline and returns the report dict."""
+    metrics.reset()
+    latencies = []
+    by_layout = {}
+    errors = 0
+    pages = 0
+
+    start = time.perf_counter()
+    for entry in manifest:
+        doc_start = time.perf_counter()
+        try:
+            pipeline.process_file(entry["path"], manual_doc_type=entry["doc_type"])
+        except Exception as e:
+            errors += 1
+            logger.error(f"Benchmark document failed {entry['path']}: {e}")
+            continue
+        elapsed = time.perf_counter() - doc_start
+        pages += entry["pages"]
+        latencies.append(elapsed)
+        by_layout.setdefault(entry["layout"], []).append(elapsed)
+    wall_time = time.perf_counter() - start
+
+    stages = {}
+    for stage, per_doc_type in metrics.snapshot().items():
+        count = sum(h["count"] for h in per_doc_type.values())
+        total = sum(h["sum"] for h in per_doc_type.values())
+        stages[stage] = {"count": count, "sum": round(total, 4), "mean": round(total / count, 4) if count else 0.0}
+
+    # Throughput and latencies only count successful documents: failing fast must not look faster
+    report = {
+        "docs": len(manifest),
+        "pages": pages,
+        "errors": errors,
+        "wall_time": round(wall_time, 4),
+        "docs_per_sec": round(len(latencies) / wall_time, 4) if wall_time else 0.0,
+        "pages_per_sec": round(pages / wall_time, 4) if wall_time else 0.0,
+        "p50_latency": round(percentile(latencies, 50), 4),
+        "p95_latency": round(percentile(latencies, 95), 4),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "layouts": {layout: _latency_summary(values) for layout, values in sorted(by_layout.items())},
+        "stages": stages
+    }
+    return report
+
+def compare_to_baseline(report, baseline, tolerance):
+    """
+    Returns a list of (metric, baseline, current, change, regressed) tuples.
+    More failed documents than in the baseline is always a regression (change is then None).
+    """
+    comparison = []
+    if "errors" in report:
+        old_errors = baseline.get("errors", 0)
+        comparison.append(("errors", old_errors, report["errors"], None, report["errors"] > old_errors))
+    for name, higher_is_better in COMPARED_METRICS.items():
+        old, new = baseline.get(name), report.get(name)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        regressed = change < -tolerance if higher_is_better else change > tolerance
+        comparison.append((name, old, new, change, regressed))
+    return comparison
+
+def print_report(report, comparison=None):
+    print(f"\n=== Benchmark: {report['docs']} documents ({report['pages']} pages processed), {report['errors']} errors ===")
+    for name in ["wall_time", "docs_per_sec", "pages_per_sec", "p50_latency", "p95_latency", "peak_rss_mb"]:
+        print(f"{name:>16}: {report[name]}")
+    print("\nLatency by layout:")
+    for layout, summary in report["layouts"].items():
+        print(f"{layout:>16}: p50={summary['p50_latency']}s p95={summary['p95_latency']}s ({summary['docs']} docs)")
+    print("\nStages (total seconds / calls):")
+    for stage, summary in sorted(report["stages"].items(), key=lambda item: -item[1]["sum"]):
+        print(f"{stage:>40}: {summary['sum']:>9.3f}s / {summary['count']}")
+    if comparison:
+        print("\nComparison with baseline:")
+        for name, old, new, change, regressed in comparison:
+            flag = "REGRESSION" if regressed else "ok"
+            print(f"{name:>16}: {old} -> {new}{'' if change is None else f' ({change:+.1%})'} {flag}")
+
+def main():
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Benchmark hors-ligne du pipeline d'anonymisation sur un corpus synthétique")
+    parser.add_argument("--corpus-dir", help="Dossier du corpus généré (temporaire par défaut)")
+    parser.add_argument("--seed", type=int, default=42, help="Graine du générateur de corpus")
+    parser.add_argument("--docs-per-type", type=int, default=1, help="Nombre de documents par type et par format")
+    parser.add_argument("--pages", type=int, default=2, help="Nombre de pages par PDF")
+    parser.add_argument("--doc-types", help="Types de documents à générer (séparés par des virgules, tous par défaut)")
+    parser.add_argument("--layouts", default=",".join(layout for layout, _ in LAYOUTS), help="Formats à générer : native, scanned, image")
+    parser.add_argument("--custom-recognizers", default="custom_recognizers.yaml", help="Fichier YAML des reconnaisseurs personnalisés")
+    parser.add_argument("--allow-lists", default="allow_lists.yaml", help="Fichier YAML des listes d'autorisation")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Fichier JSON de référence")
+    parser.add_argument("--save-baseline", action="store_true", help="Enregistre ce résultat comme nouvelle référence")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Écart relatif toléré avant de signaler une régression")
+    parser.add_argument("--report", help="Fichier JSON où écrire le rapport complet")
+    args = parser.parse_args()
+
+    doc_types = [t.strip() for t in args.doc_types.split(",")] if args.doc_types else sorted(DOC_TEMPLATES)
+    layouts = [l.strip() for l in args.layouts.split(",")]
+
+    work_dir = tempfile.mkdtemp(prefix="anonymizer_bench_")
+    corpus_dir = args.corpus_dir or os.path.join(work_dir, "corpus")
+    output_dir = os.path.join(work_dir, "output")
+    os.makedirs(output_dir)
+
+    try:
+        manifest = generate_corpus(corpus_dir, seed=args.seed, docs_per_type=args.docs_per_type, pages_per_doc=args.pages, doc_types=doc_types, layouts=layouts)
+        pipeline = AnonymizationPipeline(
+            output_dir,
+            custom_recognizers=args.custom_recognizers if os.path.exists(args.custom_recognizers) else None,
+            allow_lists=args.allow_lists if os.path.exists(args.allow_lists) else None
+        )
+        report = run_benchmark(pipeline, manifest)
+        report["config"] = {"seed": args.seed, "docs_per_type": args.docs_per_type, "pages": args.pages, "doc_types": doc_types, "layouts": layouts}
+        report["environment"] = environment()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    comparison = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get("config") != report["config"]:
+            print(f"Warning: baseline {args.baseline} was recorded with a different corpus configuration")
+        if baseline.get("environment") != report["environment"]:
+            print(f"Warning: baseline {args.baseline} was recorded on another machine or setup ({baseline.get('environment')}): record one here with --save-baseline")
+        comparison = compare_to_baseline(report, baseline, args.tolerance)
+    elif not args.save_baseline:
+        print(f"No baseline found at {args.baseline}: baselines are per machine, record one here first with --save-baseline")
+
+    print_report(report, comparison)
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4, ensure_ascii=False)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4, ensure_ascii=False)
+        print(f"\nBaseline saved to {args.baseline}")
+
+    if comparison and any(regressed for *_, regressed in comparison):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
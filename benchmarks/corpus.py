@@ -0,0 +1,150 @@
+import os
+import random
+import fitz  # PyMuPDF
+import logging
+
+logger = logging.getLogger(__name__)
+
+FIRST_NAMES = ["Jean", "Marie", "Pierre", "Sophie", "Nicolas", "Isabelle", "Julien", "Camille", "Thomas", "Nathalie", "Antoine", "Claire"]
+LAST_NAMES = ["Dupont", "Martin", "Bernard", "Dubois", "Lefèvre", "Moreau", "Laurent", "Girard", "Roux", "Fournier", "Mercier", "Lambert"]
+STREETS = ["rue de la République", "avenue Victor Hugo", "boulevard Voltaire", "rue des Lilas", "place du Marché", "chemin des Vignes"]
+CITIES = [("75011", "Paris"), ("69003", "Lyon"), ("13008", "Marseille"), ("31000", "Toulouse"), ("44000", "Nantes"), ("33000", "Bordeaux")]
+COMPANIES = ["Garage Central", "Assurances du Midi", "Plomberie Martin", "Cabinet Expertise Ouest", "Banque Populaire", "Agence Immobilière du Parc"]
+
+# Short document bodies per type, built around the keywords used by detect_doc_type
+DOC_TEMPLATES = {
+    "facture": "Facture n° FACT-{num6} du client {person}. Fournisseur : {company}, SIRET {siret}. Réparation et achat de matériel. Total TTC : {amount} euros.",
+    "devis": "Devis DEVIS-{num6} pour {person}. Estimation des matériaux et de la main-d'oeuvre pour la prestation. Entreprise {company}, SIRET {siret}.",
+    "etat_perte": "État de perte suite au sinistre déclaré par {person}, {address}. Liste des objets et valeur estimée : {amount} euros.",
+    "courrier_assureur": "Courrier de l'assureur adverse. La compagnie {company} accuse réception de la réclamation de {person}, contrat AB {num8}.",
+    "plainte": "Procès-verbal de dépôt de plainte au commissariat. Victime : {person}, demeurant {address}. Téléphone : {phone}.",
+    "constat_auto": "Constat amiable d'accident. Conducteur : {person}, véhicule immatriculé {plate}. Assurance {company}, police AB {num8}. Témoin : {person2}.",
+    "constat_habitation": "Constat de dégât des eaux : fuite sous le robinet, infiltration au plafond. Occupant : {person}, {address}.",
+    "expertise": "Rapport d'expertise. L'expert a examiné les dommages du véhicule {plate} de {person}. Conclusions : vétusté de 20 %.",
+    "bail_location": "Contrat de bail de location entre le bailleur {person} et le preneur {person2}, {address}. Loyer mensuel : {amount} euros. Dépôt de garantie versé.",
+    "extrait_compte": "Relevé de compte bancaire de {person}. IBAN {iban}. Solde créditeur. Virement reçu de {person2}, prélèvement {company}.",
+    "avis_imposition": "Avis d'imposition sur les revenus. Déclaration fiscale de {person}, {address}. Numéro fiscal {num13}.",
+    "bulletin_salaire": "Bulletin de salaire de {person}. Employeur : {company}, SIRET {siret}. Salaire brut {amount} euros, cotisations retraite, congés payés.",
+    "bulletin_hospitalisation": "Bulletin de situation d'hospitalisation. {person} admis à l'hôpital le 12/03/2024, sortie prévue après soins.",
+    "arret_travail": "Attestation d'arrêt de travail. Incapacité médicale de {person}, numéro de sécurité sociale {nir}, prolongation possible.",
+    "releve_social": "Relevé de prestations de l'organisme de sécurité sociale (ameli). Assuré : {person}, numéro {nir}.",
+    "certificat_medical": "Certificat médical. Le docteur {person2} certifie avoir examiné {person} ; aptitude confirmée après examen de santé.",
+    "identite": "Carte nationale d'identité. Nom : {last}. Prénom : {first}. Né le 04/07/1985 à {city}. Nationalité française.",
+    "carte_grise": "Certificat d'immatriculation {plate}. Titulaire : {person}, {address}. Marque Renault, modèle Clio. Préfecture de {city}.",
+    "permis_conduire": "Permis de conduire de {person}, délivré par la préfecture de {city}. Catégorie B, validité 2033.",
+    "rib": "Relevé d'identité bancaire. Titulaire : {person}. Banque {company}. IBAN {iban} BIC BNPAFRPPXXX."
+}
+
+# (layout, extension) pairs generated for every document type
+LAYOUTS = [("native", ".pdf"), ("scanned", ".pdf"), ("image", ".png")]
+
+def _luhn_complete(digits):
+    """Appends the Luhn check digit to a string of digits."""
+    total = 0
+    for i, d in enumerate(reversed(digits)):
+        n = int(d)
+        if i % 2 == 0:
+            n *= 2
+            if n > 9:
+                n -= 9
+        total += n
+    return digits + str((10 - total % 10) % 10)
+
+def fake_siret(rng):
+    siren = _luhn_complete("".join(str(rng.randint(0, 9)) for _ in range(8)))
+    return _luhn_complete(siren + "".join(str(rng.randint(0, 9)) for _ in range(4)))
+
+def fake_iban(rng):
+    bban = "".join(str(rng.randint(0, 9)) for _ in range(23))
+    # ISO 13616 check digits: FR = 15 27
+    check = 98 - int(bban + "152700") % 97
+    iban = f"FR{check:02d}{bban}"
+    return " ".join(iban[i:i + 4] for i in range(0, len(iban), 4))
+
+def fake_plate(rng):
+    letters = "ABCDEFGHJKLMNPQRSTVWXYZ"
+    return f"{rng.choice(letters)}{rng.choice(letters)}-{rng.randint(100, 999)}-{rng.choice(letters)}{rng.choice(letters)}"
+
+def fake_nir(rng):
+    return f"{rng.randint(1, 2)} {rng.randint(50, 99)} {rng.randint(1, 12):02d} {rng.randint(1, 95):02d} {rng.randint(1, 999):03d} {rng.randint(1, 999):03d} {rng.randint(1, 97):02d}"
+
+def fake_fields(rng):
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    postcode, city = rng.choice(CITIES)
+    return {
+        "first": first,
+        "last": last,
+        "person": f"{first} {last}",
+        "person2": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        "address": f"{rng.randint(1, 120)} {rng.choice(STREETS)}, {postcode} {city}",
+        "city": city,
+        "company": rng.choice(COMPANIES),
+        "siret": fake_siret(rng),
+        "iban": fake_iban(rng),
+        "plate": fake_plate(rng),
+        "nir": fake_nir(rng),
+        "phone": f"0{rng.randint(1, 7)} {rng.randint(10, 99)} {rng.randint(10, 99)} {rng.randint(10, 99)} {rng.randint(10, 99)}",
+        "amount": f"{rng.randint(50, 9999)},{rng.randint(0, 99):02d}",
+        "num6": f"{rng.randint(0, 999999):06d}",
+        "num8": f"{rng.randint(0, 99999999):08d}",
+        "num13": f"{rng.randint(0, 9999999999999):013d}"
+    }
+
+def _build_native_pdf(pages_text):
+    doc = fitz.open()
+    for text in pages_text:
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, page.rect.width - 50, page.rect.height - 50), text, fontsize=11)
+    return doc
+
+def _build_scanned_pdf(native_doc, zoom):
+    doc = fitz.open()
+    for page in native_doc:
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+        scan_page = doc.new_page(width=page.rect.width, height=page.rect.height)
+        scan_page.insert_image(scan_page.rect, pixmap=pix)
+    return doc
+
+def generate_corpus(output_dir, seed=42, docs_per_type=1, pages_per_doc=2, doc_types=None, layouts=None, zoom=2):
+    """
+    Writes a deterministic synthetic corpus of French documents filled with fake PII.
+    Each document type gets a native PDF, a scanned (image-only) PDF and a PNG image.
+    Returns a list of {"path", "doc_type", "layout", "pages"} entries.
+    """
+    rng = random.Random(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    doc_types = doc_types or sorted(DOC_TEMPLATES)
+    layouts = layouts or [layout for layout, _ in LAYOUTS]
+    manifest = []
+
+    for doc_type in doc_types:
+        template = DOC_TEMPLATES[doc_type]
+        for index in range(docs_per_type):
+            pages_text = []
+            for _ in range(pages_per_doc):
+                paragraphs = [template.format(**fake_fields(rng)) for _ in range(3)]
+                pages_text.append("\n\n".join(paragraphs))
+
+            native_doc = _build_native_pdf(pages_text)
+            try:
+                for layout, ext in LAYOUTS:
+                    if layout not in layouts:
+                        continue
+                    path = os.path.join(output_dir, f"{doc_type}_{index:03d}_{layout}{ext}")
+                    if layout == "native":
+                        native_doc.save(path, garbage=4, deflate=True, no_new_id=True)
+                        pages = len(native_doc)
+                    elif layout == "scanned":
+                        scanned_doc = _build_scanned_pdf(native_doc, zoom)
+                        scanned_doc.save(path, garbage=4, deflate=True, no_new_id=True)
+                        scanned_doc.close()
+                        pages = len(native_doc)
+                    else:
+                        native_doc[0].get_pixmap(matrix=fitz.Matrix(zoom, zoom)).save(path)
+                        pages = 1
+                    manifest.append({"path": path, "doc_type": doc_type, "layout": layout, "pages": pages})
+            finally:
+                native_doc.close()
+
+    logger.info(f"Generated {len(manifest)} synthetic documents in {output_dir}")
+    return manifest
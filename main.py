@@ -1,8 +1,20 @@
 import argparse
 import os
+import sys
+import json
+import time
 import logging
 import traceback
-from anonymizer.pipeline import AnonymizationPipeline
+from contextlib import nullcontext
+from functools import partial
+from anonymizer.pipeline import AnonymizationPipeline, is_supported
+from anonymizer.analyzer import FrenchAnalyzer
+from anonymizer.refilter import RawDetectionStore, Refilterer
+from anonymizer.utils import create_audit_logger, SQLiteAuditLogger
+from anonymizer.manifest import ProcessedManifest, config_fingerprint
+from anonymizer.job_queue import JobQueue, QueueRunner
+from anonymizer.cluster import ClusterNode, cluster_status
+from anonymizer.metrics import metrics, SlowestProfiles
 
 # Configure logging
 logging.basicConfig(
@@ -15,6 +27,203 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def process_stdin(pipeline, filename, audit_file=None):
+    """Anonymizes a single document read from stdin and writes it to stdout."""
+    data = sys.stdin.buffer.read()
+    logger.info(f"Read {len(data)} bytes from stdin for {filename}")
+
+    try:
+        result = pipeline.process_bytes(data, filename)
+    except Exception as e:
+        logger.error(f"Error processing {filename}: {e}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        sys.exit(1)
+
+    if result is None:
+        logger.error(f"Processing returned no result for: {filename}")
+        sys.exit(1)
+
+    redacted_bytes, audit_data = result
+    sys.stdout.buffer.write(redacted_bytes)
+    sys.stdout.buffer.flush()
+
+    if audit_file:
+        with open(audit_file, 'w', encoding='utf-8') as f:
+            json.dump(audit_data, f, indent=4, ensure_ascii=False)
+        logger.info(f"Audit log: {audit_file}")
+
+def process_files(pipeline, file_paths, manifest, profiles=None):
+    """
+    Processes the given files, recording each success in the manifest once
+    the audit backend has stored its audit (batch by batch for SQLite).
+    Returns (success_count, failed_paths, skipped_paths), skipped files being
+    those the pipeline returned no result for (e.g. unsupported formats).
+    """
+    success_count = 0
+    failed = []
+    skipped = []
+
+    for file_path in file_paths:
+        filename = os.path.basename(file_path)
+        logger.info(f"\n=== Processing file: {filename} ===")
+        try:
+            with profiles.profile(filename) if profiles else nullcontext():
+                result = pipeline.process_file(file_path)
+            if result:
+                success_count += 1
+                # A buffered audit backend must store the file's audit before the manifest marks it done
+                pipeline.logger.on_stored(partial(manifest.mark_processed, file_path, result))
+                logger.info(f"Successfully processed: {filename}")
+            else:
+                skipped.append(file_path)
+                logger.warning(f"Processing returned no result for: {filename}")
+        except Exception as e:
+            failed.append(file_path)
+            logger.error(f"Error processing {filename}: {e}")
+            logger.error(f"Traceback: {traceback.format_exc()}")
+
+    # The last, partial batch: its files are marked processed once it is stored
+    try:
+        pipeline.logger.flush()
+    except Exception as e:
+        # Kept buffered: the files are marked on the next successful flush
+        logger.error(f"Error storing the audit batch: {e}")
+    return success_count, failed, skipped
+
+def watch(pipeline, input_dir, manifest, poll_interval, profiles=None):
+    """Polls input_dir and processes new or modified files until interrupted."""
+    logger.info(f"Watching {input_dir} every {poll_interval}s (Ctrl+C to stop)")
+    previous = {}
+    failed = {}
+    try:
+        while True:
+            current = {}
+            for f in os.listdir(input_dir):
+                path = os.path.join(input_dir, f)
+                if os.path.isfile(path):
+                    stat = os.stat(path)
+                    current[path] = (stat.st_size, stat.st_mtime)
+
+            # A file is only picked up once its size and mtime are stable across two polls,
+            # so that files still being copied are not processed half-written.
+            # Failed and skipped (unsupported) files are retried only once they change.
+            stable = [path for path, signature in current.items() if previous.get(path) == signature and failed.get(path) != signature]
+            pending = manifest.filter_pending(stable)
+            if pending:
+                logger.info(f"Found {len(pending)} new files to process")
+                success_count, failed_paths, skipped_paths = process_files(pipeline, pending, manifest, profiles)
+                for path in failed_paths + skipped_paths:
+                    failed[path] = current[path]
+                logger.info(f"Batch complete. Success: {success_count}, Errors: {len(failed_paths)}")
+
+            previous = current
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        logger.info("Watch mode stopped")
+
+def triage(pipeline, file_paths, report_path):
+    """Analyzes the files without anonymizing them and writes a per-document PII summary to report_path."""
+    summaries = []
+    error_count = 0
+    for file_path in file_paths:
+        filename = os.path.basename(file_path)
+        try:
+            summary = pipeline.analyze_file(file_path)
+        except Exception as e:
+            error_count += 1
+            logger.error(f"Error analyzing {filename}: {e}")
+            logger.error(f"Traceback: {traceback.format_exc()}")
+            continue
+        if summary is None:
+            continue
+        summaries.append(summary)
+        entities = ", ".join(f"{entity_type} x{count}" for entity_type, count in summary["entities"].items()) or "aucune donnée personnelle"
+        print(f"{filename} ({summary['doc_type'] or 'type inconnu'}, {summary['pages']} p.) : {summary['detections']} détections - {entities}")
+
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(summaries, f, indent=4, ensure_ascii=False)
+
+    with_pii = sum(1 for summary in summaries if summary["detections"])
+    logger.info(f"\n=== Triage complete ===")
+    logger.info(f"Documents with PII: {with_pii}/{len(summaries)}, Errors: {error_count}. Report: {report_path}")
+
+def build_pipeline(output_dir, audit_backend="json", audit_db=None, audit_batch_size=100, **options):
+    """Creates a pipeline with its own audit backend (used inside queue worker processes)."""
+    audit_logger = create_audit_logger(audit_backend, output_dir, db_path=audit_db, batch_size=audit_batch_size)
+    return AnonymizationPipeline(output_dir, audit_logger=audit_logger, **options)
+
+def process_queue(file_paths, queue, manifest, pipeline_factory, workers, timeout, force=False):
+    """
+    Enqueues the files and runs the queue in isolated worker processes until it is drained.
+    Queued jobs keep their attempts and dead letters stay dead unless their file changed or force is set.
+    """
+    for file_path in file_paths:
+        queue.enqueue(file_path, reset=force)
+    logger.info(f"Enqueued {len(file_paths)} files")
+
+    runner = QueueRunner(
+        queue,
+        pipeline_factory,
+        workers=workers,
+        timeout=timeout,
+        on_done=lambda path, output_path: manifest.mark_processed(path, output_path)
+    )
+    counts = runner.run()
+
+    logger.info(f"\n=== Queue complete ===")
+    logger.info(f"Done: {counts.get('done', 0)}, Dead-lettered: {counts.get('dead', 0)}")
+    for path, attempts, error in queue.dead_letters():
+        logger.error(f"Dead letter: {path} after {attempts} attempts: {error.splitlines()[0] if error else ''}")
+
+def show_cluster_status(input_dir, cluster_dir, fingerprint, lease_seconds):
+    """Prints the combined progress of every node of a cluster run."""
+    summary = cluster_status(input_dir, cluster_dir, fingerprint=fingerprint, lease_seconds=lease_seconds)
+    print(f"Fichiers : {summary['total']} | traités : {summary['done']} | en cours : {summary['in_progress']} | "
+          f"en attente : {summary['pending']} | bail expiré : {summary['stale']} | échecs : {summary['failed']}")
+    for node, entry in sorted(summary["nodes"].items()):
+        print(f"  {node} : {entry['done']} traités, {entry['failed']} échecs, {entry['in_progress']} en cours, {entry['seconds']:.1f}s")
+    for filename, error in sorted(summary["errors"].items()):
+        print(f"  échec {filename} : {error}")
+
+def export_audit(db_path, output_dir):
+    """Regenerates the per-document JSON audit files from a SQLite audit database."""
+    if not os.path.exists(db_path):
+        logger.error(f"Audit database '{db_path}' does not exist")
+        return
+
+    audit_logger = SQLiteAuditLogger(db_path)
+    try:
+        count = audit_logger.export_json(output_dir)
+    finally:
+        audit_logger.close()
+    logger.info(f"Exported {count} audit files from {db_path} to {output_dir}")
+
+def refilter(raw_dir, output_dir, allow_lists_path, entities_to_ignore, audit_logger, doc_type=None):
+    """Re-renders every document of raw_dir with the current filter configuration."""
+    if not os.path.exists(raw_dir):
+        logger.error(f"Raw detections folder '{raw_dir}' does not exist")
+        return
+
+    store = RawDetectionStore(raw_dir)
+    # Only the allow lists and thresholds are needed: no NLP model is loaded
+    refilterer = Refilterer(FrenchAnalyzer.build_filter(allow_lists_path), output_dir, audit_logger, entities_to_ignore=entities_to_ignore)
+
+    success_count = 0
+    error_count = 0
+    for raw_path in store.iter_records():
+        try:
+            if refilterer.refilter(store.load(raw_path), doc_type=doc_type):
+                success_count += 1
+            else:
+                error_count += 1
+        except Exception as e:
+            error_count += 1
+            logger.error(f"Error refiltering {raw_path}: {e}")
+            logger.error(f"Traceback: {traceback.format_exc()}")
+
+    logger.info(f"\n=== Refilter complete ===")
+    logger.info(f"Success: {success_count}, Errors: {error_count}")
+
 def main():
     logger.info("Starting anonymization process...")
     parser = argparse.ArgumentParser(description="Anonymisation de documents (Images et PDF) - Français")
@@ -24,14 +233,57 @@ def main():
     parser.add_argument("--allow-lists", default="allow_lists.yaml", help="Fichier YAML des listes d'autorisation")
     parser.add_argument("--doc-type", help="Type de document manuel (ex: facture, devis, extrait_compte, bulletin_salaire, etc.)")
     parser.add_argument("--ignore-entities", default="DATE_TIME,CARDINAL", help="Liste d'entités à ignorer (séparées par des virgules)")
+    parser.add_argument("--stdin", action="store_true", help="Lire un document sur l'entrée standard et écrire le document anonymisé sur la sortie standard")
+    parser.add_argument("--filename", help="Nom du fichier lu sur l'entrée standard (extension et détection du type)")
+    parser.add_argument("--audit-file", help="Fichier JSON où écrire l'audit en mode --stdin")
+    parser.add_argument("--raw-dir", help="Dossier où conserver les détections brutes (avant filtrage) et le texte extrait, pour --refilter. Contient des données personnelles en clair")
+    parser.add_argument("--refilter", action="store_true", help="Réapplique les listes d'autorisation, seuils et entités ignorées aux détections de --raw-dir sans nouvelle analyse")
+    parser.add_argument("--audit-backend", choices=["json", "sqlite"], default="json", help="Stockage de l'audit : un fichier JSON par document ou une base SQLite indexée")
+    parser.add_argument("--audit-db", help="Base SQLite d'audit (par défaut <output>/audit.db)")
+    parser.add_argument("--audit-batch-size", type=int, default=100, help="Nombre de documents par transaction SQLite")
+    parser.add_argument("--export-audit", metavar="DIR", help="Régénère les fichiers JSON d'audit depuis la base SQLite dans DIR, puis quitte")
+    parser.add_argument("--force", action="store_true", help="Retraite tous les fichiers, même ceux déjà traités avec la même configuration")
+    parser.add_argument("--manifest", help="Base des fichiers déjà traités (par défaut <output>/manifest.db)")
+    parser.add_argument("--watch", action="store_true", help="Surveille le dossier d'entrée et traite les nouveaux fichiers au fil de l'eau")
+    parser.add_argument("--poll-interval", type=float, default=5.0, help="Intervalle de scrutation du dossier d'entrée en secondes (--watch)")
+    parser.add_argument("--queue", action="store_true", help="Traite les fichiers via une file persistante (SQLite) dans des processus isolés, avec délai maximal, nouvelles tentatives et liste des échecs définitifs")
+    parser.add_argument("--queue-db", help="Base de la file de traitement (par défaut <output>/queue.db)")
+    parser.add_argument("--workers", type=int, default=1, help="Nombre de processus de traitement en mode --queue")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Durée maximale de traitement d'un fichier en secondes (--queue)")
+    parser.add_argument("--max-attempts", type=int, default=3, help="Nombre de tentatives avant de classer un fichier en échec définitif (--queue)")
+    parser.add_argument("--retry-delay", type=float, default=30.0, help="Délai avant la première nouvelle tentative, doublé à chaque échec (--queue)")
+    parser.add_argument("--cluster", action="store_true", help="Mode grappe : plusieurs nœuds se partagent les mêmes dossiers d'entrée et de sortie (partage réseau)")
+    parser.add_argument("--cluster-dir", help="Dossier partagé des verrous et états des nœuds (par défaut <output>/.cluster)")
+    parser.add_argument("--node-id", help="Identifiant de ce nœud (par défaut nom d'hôte et PID)")
+    parser.add_argument("--lease", type=float, default=300.0, help="Durée en secondes après laquelle le fichier d'un nœud qui ne répond plus est repris par un autre (--cluster)")
+    parser.add_argument("--cluster-status", action="store_true", help="Affiche l'avancement combiné de tous les nœuds, puis quitte")
+    parser.add_argument("--page-window", type=int, help="Traite les PDF par tranches de N pages écrites au fur et à mesure (gros documents)")
+    parser.add_argument("--max-pdf-memory", type=float, metavar="MO", help="Mémoire maximale (en Mo) consacrée aux pages d'un PDF en cours de traitement ; fixe la taille des tranches")
+    parser.add_argument("--analyze-only", action="store_true", help="Tri : détecte les données personnelles de chaque document sans l'anonymiser ni rien écrire d'autre qu'un rapport de synthèse")
+    parser.add_argument("--triage-report", help="Rapport JSON du mode --analyze-only (par défaut <output>/triage.json)")
+    parser.add_argument("--metrics", help="Fichier où exporter les durées par étape (.prom pour Prometheus, JSON sinon)")
+    parser.add_argument("--profile", type=int, default=0, metavar="N", help="Profile chaque fichier avec cProfile et conserve les N plus lents")
+    parser.add_argument("--profile-dir", default="profiles", help="Dossier où écrire les profils cProfile (.prof)")
 
     args = parser.parse_args()
 
-    if not os.path.exists(args.input):
+    if args.stdin and not args.filename:
+        logger.error("--filename is required with --stdin")
+        return
+
+    if args.export_audit:
+        export_audit(args.audit_db or os.path.join(args.output, "audit.db"), args.export_audit)
+        return
+
+    if args.refilter and not args.raw_dir:
+        logger.error("--raw-dir is required with --refilter")
+        return
+
+    if not args.stdin and not args.refilter and not os.path.exists(args.input):
         logger.error(f"Input folder '{args.input}' does not exist")
         return
 
-    if not os.path.exists(args.output):
+    if not args.stdin and not os.path.exists(args.output):
         os.makedirs(args.output)
         logger.info(f"Created output directory: {args.output}")
 
@@ -43,47 +295,143 @@ def main():
     logger.info(f"Custom recognizers: {custom_rec_path}, Allow lists: {allow_lists_path}")
     logger.info(f"Entities to ignore: {entities_to_ignore}")
 
+    fingerprint = config_fingerprint(
+        [custom_rec_path, allow_lists_path],
+        entities_to_ignore=entities_to_ignore,
+        doc_type=args.doc_type
+    )
+    manifest_path = args.manifest or os.path.join(args.output, "manifest.db")
+    cluster_dir = args.cluster_dir or os.path.join(args.output, ".cluster")
+
+    if args.cluster_status:
+        show_cluster_status(args.input, cluster_dir, fingerprint, args.lease)
+        return
+
+    if args.analyze_only and (args.stdin or args.refilter or args.watch or args.queue or args.cluster):
+        logger.error("--analyze-only cannot be combined with --stdin, --refilter, --watch, --queue or --cluster")
+        return
+
+    if args.queue and not args.stdin and not args.refilter:
+        if args.metrics or args.profile:
+            logger.warning("--metrics and --profile are not collected in --queue mode")
+        # Each worker process builds its own pipeline and audit backend
+        pipeline_factory = partial(
+            build_pipeline,
+            args.output,
+            audit_backend=args.audit_backend,
+            audit_db=args.audit_db,
+            audit_batch_size=args.audit_batch_size,
+            custom_recognizers=custom_rec_path,
+            allow_lists=allow_lists_path,
+            entities_to_ignore=entities_to_ignore,
+            default_doc_type=args.doc_type,
+            raw_dir=args.raw_dir,
+            page_window=args.page_window,
+            max_pdf_memory_mb=args.max_pdf_memory
+        )
+        file_paths = [os.path.join(args.input, f) for f in os.listdir(args.input) if os.path.isfile(os.path.join(args.input, f))]
+        # An unsupported file would fail the same way on every retry: it is not enqueued at all
+        unsupported = [path for path in file_paths if not is_supported(path)]
+        if unsupported:
+            logger.warning(f"Skipping {len(unsupported)} unsupported files: {[os.path.basename(path) for path in unsupported]}")
+        file_paths = [path for path in file_paths if is_supported(path)]
+        manifest = ProcessedManifest(manifest_path, fingerprint)
+        queue = JobQueue(args.queue_db or os.path.join(args.output, "queue.db"), max_attempts=args.max_attempts, retry_delay=args.retry_delay)
+        try:
+            if not args.force:
+                file_paths = manifest.filter_pending(file_paths)
+            process_queue(file_paths, queue, manifest, pipeline_factory, args.workers, args.timeout, force=args.force)
+        finally:
+            queue.close()
+            manifest.close()
+        return
+
+    # Triage writes no audit: the pipeline keeps its default, unused JSON backend
+    audit_logger = None if args.analyze_only else create_audit_logger(args.audit_backend, args.output, db_path=args.audit_db, batch_size=args.audit_batch_size)
+
+    if args.refilter:
+        try:
+            refilter(args.raw_dir, args.output, allow_lists_path, entities_to_ignore, audit_logger, args.doc_type)
+        finally:
+            audit_logger.close()
+        return
+
     try:
         pipeline = AnonymizationPipeline(
             args.output,
             custom_recognizers=custom_rec_path,
             allow_lists=allow_lists_path,
             entities_to_ignore=entities_to_ignore,
-            default_doc_type=args.doc_type
+            default_doc_type=args.doc_type,
+            raw_dir=args.raw_dir,
+            audit_logger=audit_logger,
+            page_window=args.page_window,
+            max_pdf_memory_mb=args.max_pdf_memory
         )
         logger.info("Pipeline initialized successfully")
     except Exception as e:
         logger.error(f"Failed to initialize pipeline: {e}", exc_info=True)
         return
 
-    files_to_process = [f for f in os.listdir(args.input) if os.path.isfile(os.path.join(args.input, f))]
-
-    if not files_to_process:
-        logger.warning("No files found in input folder")
+    if args.stdin:
+        process_stdin(pipeline, args.filename, args.audit_file)
+        if args.metrics:
+            metrics.export(args.metrics)
         return
 
-    logger.info(f"Found {len(files_to_process)} files to process: {files_to_process}")
+    if args.analyze_only:
+        # No anonymized file, audit log or manifest entry is written
+        file_paths = [os.path.join(args.input, f) for f in sorted(os.listdir(args.input)) if os.path.isfile(os.path.join(args.input, f))]
+        triage(pipeline, file_paths, args.triage_report or os.path.join(args.output, "triage.json"))
+        if args.metrics:
+            metrics.export(args.metrics)
+        return
 
-    success_count = 0
-    error_count = 0
-    
-    for filename in files_to_process:
-        file_path = os.path.join(args.input, filename)
-        logger.info(f"\n=== Processing file: {filename} ===")
+    if args.cluster:
+        # Done markers in the shared cluster directory replace the local manifest
+        node = ClusterNode(args.input, cluster_dir, pipeline, fingerprint=fingerprint, node_id=args.node_id,
+                           lease_seconds=args.lease, poll_interval=args.poll_interval)
         try:
-            result = pipeline.process_file(file_path)
-            if result:
-                success_count += 1
-                logger.info(f"Successfully processed: {filename}")
-            else:
-                logger.warning(f"Processing returned no result for: {filename}")
-        except Exception as e:
-            error_count += 1
-            logger.error(f"Error processing {filename}: {e}")
-            logger.error(f"Traceback: {traceback.format_exc()}")
-    
-    logger.info(f"\n=== Processing complete ===")
-    logger.info(f"Success: {success_count}, Errors: {error_count}, Total: {len(files_to_process)}")
+            node.run()
+        finally:
+            audit_logger.close()
+        if args.metrics:
+            metrics.export(args.metrics)
+        return
+
+    profiles = SlowestProfiles(args.profile) if args.profile > 0 else None
+    manifest = ProcessedManifest(manifest_path, fingerprint)
+
+    try:
+        if args.watch:
+            watch(pipeline, args.input, manifest, args.poll_interval, profiles)
+        else:
+            files_to_process = [f for f in os.listdir(args.input) if os.path.isfile(os.path.join(args.input, f))]
+
+            if not files_to_process:
+                logger.warning("No files found in input folder")
+                return
+
+            logger.info(f"Found {len(files_to_process)} files to process: {files_to_process}")
+
+            file_paths = [os.path.join(args.input, f) for f in files_to_process]
+            if not args.force:
+                file_paths = manifest.filter_pending(file_paths)
+                logger.info(f"Skipping {len(files_to_process) - len(file_paths)} files already processed with this configuration")
+
+            success_count, failed, skipped = process_files(pipeline, file_paths, manifest, profiles)
+
+            logger.info(f"\n=== Processing complete ===")
+            logger.info(f"Success: {success_count}, Errors: {len(failed)}, Skipped: {len(skipped)}, Total: {len(file_paths)}")
+    finally:
+        # Writes the last batch of a buffered audit backend
+        audit_logger.close()
+        manifest.close()
+
+    if args.metrics:
+        metrics.export(args.metrics)
+    if profiles:
+        profiles.dump(args.profile_dir)
 
 if __name__ == "__main__":
     main()
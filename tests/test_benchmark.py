@@ -0,0 +1,73 @@
+import unittest
+import os
+import shutil
+import fitz
+from benchmarks.corpus import generate_corpus, fake_iban, fake_siret
+from benchmarks.bench import percentile, compare_to_baseline, run_benchmark
+import random
+
+class TestBenchmarkCorpus(unittest.TestCase):
+    def setUp(self):
+        self.test_dirs = ["test_corpus_a", "test_corpus_b"]
+
+    def tearDown(self):
+        for test_dir in self.test_dirs:
+            if os.path.exists(test_dir):
+                shutil.rmtree(test_dir)
+
+    def test_corpus_is_deterministic(self):
+        manifest_a = generate_corpus(self.test_dirs[0], doc_types=["rib"], zoom=1)
+        manifest_b = generate_corpus(self.test_dirs[1], doc_types=["rib"], zoom=1)
+
+        self.assertEqual([e["layout"] for e in manifest_a], ["native", "scanned", "image"])
+        for entry_a, entry_b in zip(manifest_a, manifest_b):
+            with open(entry_a["path"], 'rb') as fa, open(entry_b["path"], 'rb') as fb:
+                self.assertEqual(fa.read(), fb.read())
+
+    def test_scanned_pdf_has_no_text(self):
+        manifest = generate_corpus(self.test_dirs[0], doc_types=["facture"], layouts=["native", "scanned"], zoom=1)
+        native, scanned = manifest
+        with fitz.open(native["path"]) as doc:
+            self.assertIn("SIRET", doc[0].get_text())
+        with fitz.open(scanned["path"]) as doc:
+            self.assertEqual(doc[0].get_text().strip(), "")
+
+    def test_fake_identifiers_are_valid(self):
+        rng = random.Random(0)
+        iban = fake_iban(rng).replace(" ", "")
+        rearranged = iban[4:] + iban[:4]
+        self.assertEqual(int("".join(str(int(c, 36)) for c in rearranged)) % 97, 1)
+        self.assertEqual(len(fake_siret(rng)), 14)
+
+    def test_percentile_and_comparison(self):
+        self.assertEqual(percentile([1, 2, 3, 4], 50), 2)
+        self.assertEqual(percentile([1, 2, 3, 4], 95), 4)
+
+        comparison = compare_to_baseline({"docs_per_sec": 5.0, "p95_latency": 1.0}, {"docs_per_sec": 10.0, "p95_latency": 1.0}, 0.2)
+        regressed = {name: flag for name, _, _, _, flag in comparison}
+        self.assertTrue(regressed["docs_per_sec"])
+        self.assertFalse(regressed["p95_latency"])
+
+        # Failing fast on some documents is not a speedup
+        comparison = compare_to_baseline({"docs_per_sec": 20.0, "errors": 2}, {"docs_per_sec": 10.0, "errors": 0}, 0.2)
+        regressed = {name: flag for name, _, _, _, flag in comparison}
+        self.assertTrue(regressed["errors"])
+        self.assertFalse(regressed["docs_per_sec"])
+
+    def test_failed_documents_are_not_counted_as_throughput(self):
+        class FailingPipeline:
+            def process_file(self, path, manual_doc_type=None):
+                if path == "bad.pdf":
+                    raise ValueError("unreadable file")
+
+        manifest = [
+            {"path": "good.pdf", "doc_type": "rib", "layout": "native", "pages": 2},
+            {"path": "bad.pdf", "doc_type": "rib", "layout": "native", "pages": 10}
+        ]
+        report = run_benchmark(FailingPipeline(), manifest)
+        self.assertEqual((report["docs"], report["pages"], report["errors"]), (2, 2, 1))
+        self.assertEqual(report["layouts"]["native"]["docs"], 1)
+        self.assertAlmostEqual(report["pages_per_sec"] / report["docs_per_sec"], 2.0, places=2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+import unittest
+import os
+import json
+import shutil
+import time
+import multiprocessing
+from unittest.mock import patch
+from anonymizer.cluster import ClusterNode, ClusterState, FileLease, cluster_status, read_lock_owner, write_json_atomic
+
+class RecordingProcessor:
+    """Appends every processed file to a shared log so duplicates can be detected."""
+
+    def __init__(self, log_path, output_dir, delay=0.0):
+        self.log_path = log_path
+        self.output_dir = output_dir
+        self.delay = delay
+
+    def process_file(self, path):
+        time.sleep(self.delay)
+        name = os.path.basename(path)
+        if name.startswith("error"):
+            raise ValueError("unreadable file")
+        with open(self.log_path, 'a') as f:
+            f.write(name + "\n")
+        output_path = os.path.join(self.output_dir, name)
+        with open(output_path, 'w') as f:
+            f.write("redacted")
+        return output_path
+
+def run_node(input_dir, cluster_dir, log_path, output_dir, node_id):
+    processor = RecordingProcessor(log_path, output_dir, delay=0.02)
+    ClusterNode(input_dir, cluster_dir, processor, fingerprint="cfg", node_id=node_id, lease_seconds=30, poll_interval=0.05).run()
+
+class TestCluster(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = "test_cluster_output"
+        self.input_dir = os.path.join(self.test_dir, "input")
+        self.output_dir = os.path.join(self.test_dir, "output")
+        self.cluster_dir = os.path.join(self.output_dir, ".cluster")
+        self.log_path = os.path.join(self.test_dir, "processed.log")
+        os.makedirs(self.input_dir, exist_ok=True)
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def tearDown(self):
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+
+    def make_inputs(self, names):
+        for name in names:
+            with open(os.path.join(self.input_dir, name), 'w') as f:
+                f.write(name)
+
+    def processed(self):
+        with open(self.log_path) as f:
+            return f.read().split()
+
+    def test_local_nodes_process_each_file_once(self):
+        names = [f"doc{i:02d}.pdf" for i in range(30)]
+        self.make_inputs(names)
+
+        nodes = [
+            multiprocessing.Process(target=run_node, args=(self.input_dir, self.cluster_dir, self.log_path, self.output_dir, f"node{i}"))
+            for i in range(3)
+        ]
+        for node in nodes:
+            node.start()
+        for node in nodes:
+            node.join(60)
+            self.assertEqual(node.exitcode, 0)
+
+        self.assertEqual(sorted(self.processed()), names)
+        summary = cluster_status(self.input_dir, self.cluster_dir, fingerprint="cfg")
+        self.assertEqual(summary["done"], 30)
+        self.assertEqual(summary["pending"], 0)
+        self.assertEqual(sum(entry["done"] for entry in summary["nodes"].values()), 30)
+        self.assertEqual(os.listdir(os.path.join(self.cluster_dir, "locks")), [])
+
+    def test_expired_lease_is_taken_over(self):
+        self.make_inputs(["a.pdf", "b.pdf"])
+        state = ClusterState(self.cluster_dir, "cfg")
+        # A node died while holding a.pdf
+        with open(state.lock_path("a.pdf"), 'w') as f:
+            json.dump({"node": "dead-node"}, f)
+        old = time.time() - 120
+        os.utime(state.lock_path("a.pdf"), (old, old))
+
+        summary = cluster_status(self.input_dir, self.cluster_dir, fingerprint="cfg", lease_seconds=60)
+        self.assertEqual(summary["stale"], 1)
+
+        processor = RecordingProcessor(self.log_path, self.output_dir)
+        done, failed = ClusterNode(self.input_dir, self.cluster_dir, processor, fingerprint="cfg", node_id="live", lease_seconds=60).run()
+        self.assertEqual((done, failed), (2, 0))
+        self.assertEqual(sorted(self.processed()), ["a.pdf", "b.pdf"])
+
+    def test_live_lease_is_not_taken(self):
+        self.make_inputs(["a.pdf"])
+        state = ClusterState(self.cluster_dir, "cfg")
+        lease = FileLease(state.lock_path("a.pdf"), "holder", 60)
+        self.assertTrue(lease.acquire())
+        try:
+            self.assertFalse(FileLease(state.lock_path("a.pdf"), "other", 60).acquire())
+            summary = cluster_status(self.input_dir, self.cluster_dir, fingerprint="cfg", lease_seconds=60)
+            self.assertEqual(summary["in_progress"], 1)
+            self.assertEqual(summary["nodes"]["holder"]["in_progress"], 1)
+        finally:
+            lease.release()
+        self.assertFalse(os.path.exists(state.lock_path("a.pdf")))
+
+    def test_expired_lease_replaced_during_takeover_is_given_back(self):
+        state = ClusterState(self.cluster_dir, "cfg")
+        lock_path = state.lock_path("a.pdf")
+        with open(lock_path, 'w') as f:
+            json.dump({"node": "dead-node", "claimed_at": "2026-10-01T00:00:00"}, f)
+        old = time.time() - 120
+        os.utime(lock_path, (old, old))
+
+        real_rename = os.rename
+        def rename_after_replacement(src, dst):
+            # Another node takes the expired lease over between our check and our rename
+            with open(src, 'w') as f:
+                json.dump({"node": "fast-node", "claimed_at": "2026-10-19T00:00:00"}, f)
+            os.utime(src, (old, old))
+            real_rename(src, dst)
+
+        with patch("anonymizer.cluster.os.rename", side_effect=rename_after_replacement):
+            self.assertFalse(FileLease(lock_path, "late-node", 60).acquire())
+        with open(lock_path) as f:
+            self.assertEqual(json.load(f)["node"], "fast-node")
+        self.assertEqual(os.listdir(state.lock_dir), ["a.pdf.lock"])
+
+    def test_heartbeat_restores_missing_lock(self):
+        state = ClusterState(self.cluster_dir, "cfg")
+        lease = FileLease(state.lock_path("a.pdf"), "holder", 0.3)
+        self.assertTrue(lease.acquire())
+        try:
+            # Left missing by another node's expiry check that did not complete
+            os.unlink(state.lock_path("a.pdf"))
+            time.sleep(0.35)
+            with open(state.lock_path("a.pdf")) as f:
+                self.assertEqual(json.load(f)["node"], "holder")
+            self.assertFalse(lease.lost.is_set())
+        finally:
+            lease.release()
+        self.assertFalse(os.path.exists(state.lock_path("a.pdf")))
+
+    def test_heartbeat_reports_lease_taken_by_another_node(self):
+        state = ClusterState(self.cluster_dir, "cfg")
+        lease = FileLease(state.lock_path("a.pdf"), "holder", 0.3)
+        self.assertTrue(lease.acquire())
+        try:
+            # Another node took the lease over (e.g. after a stall longer than the lease)
+            write_json_atomic(state.lock_path("a.pdf"), {"node": "other", "claimed_at": "2026-10-19T00:00:00"})
+            time.sleep(0.35)
+            self.assertTrue(lease.lost.is_set())
+        finally:
+            lease.release()
+        self.assertEqual(read_lock_owner(state.lock_path("a.pdf")), "other")
+
+    def test_failures_and_configuration_change(self):
+        self.make_inputs(["ok.pdf", "error.pdf"])
+        processor = RecordingProcessor(self.log_path, self.output_dir)
+
+        self.assertEqual(ClusterNode(self.input_dir, self.cluster_dir, processor, fingerprint="cfg", node_id="n").run(), (1, 1))
+        summary = cluster_status(self.input_dir, self.cluster_dir, fingerprint="cfg")
+        self.assertEqual((summary["done"], summary["failed"]), (1, 1))
+        self.assertIn("unreadable file", summary["errors"]["error.pdf"])
+
+        # Nothing left to do with the same configuration
+        self.assertEqual(ClusterNode(self.input_dir, self.cluster_dir, processor, fingerprint="cfg", node_id="n").run(), (0, 0))
+        # A new configuration processes everything again
+        self.assertEqual(ClusterNode(self.input_dir, self.cluster_dir, processor, fingerprint="cfg2", node_id="n").run(), (1, 1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+import numpy as np
+from PIL import Image
+from anonymizer.detections import Detection, merge_line_boxes, fill_boxes, redact_image
+
+class TestDetections(unittest.TestCase):
+    def test_merge_line_boxes(self):
+        boxes = [[50, 0, 80, 10], [0, 0, 20, 10], [25, 1, 45, 11], [0, 20, 30, 30], [300, 0, 320, 10]]
+        self.assertEqual(merge_line_boxes(boxes), [[0, 0, 80, 11], [300, 0, 320, 10], [0, 20, 30, 30]])
+
+    def test_fill_boxes_clips_and_keeps_alpha(self):
+        pixels = np.full((10, 10, 4), 200, dtype=np.uint8)
+        fill_boxes(pixels, [[-5, 8, 2.5, 20]], alpha=True)
+        self.assertEqual(pixels[9, 0].tolist(), [0, 0, 0, 255])
+        self.assertEqual(pixels[9, 3].tolist(), [0, 0, 0, 255])
+        self.assertEqual(pixels[9, 4].tolist(), [200, 200, 200, 200])
+        self.assertEqual(pixels[7, 0].tolist(), [200, 200, 200, 200])
+
+    def test_redact_image_modes(self):
+        detection = Detection("PERSON", 0, 4, 0.9, [[2, 2, 5, 5]])
+        for mode, white, black in [("RGB", (255, 255, 255), (0, 0, 0)), ("L", 255, 0), ("1", 255, 0), ("P", (255, 255, 255), (0, 0, 0))]:
+            image = Image.new(mode, (10, 10), "white")
+            redacted = redact_image(image, [detection])
+            self.assertEqual(redacted.getpixel((3, 3)), black, mode)
+            self.assertEqual(redacted.getpixel((8, 8)), white, mode)
+            self.assertEqual(image.getpixel((3, 3)), image.getpixel((8, 8)), mode)
+
+if __name__ == '__main__':
+    unittest.main()
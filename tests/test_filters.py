@@ -0,0 +1,43 @@
+import unittest
+import os
+from anonymizer.filters import DetectionFilter
+from anonymizer.detections import Detection
+
+class TestDetectionFilter(unittest.TestCase):
+    def setUp(self):
+        self.filter = DetectionFilter(["euro"], {"facture": ["client"]})
+        self.text = "Client Jean Dupont paye 10 euros"
+
+    def test_allow_list_is_case_insensitive(self):
+        results = [Detection("PERSON", 0, 6, 0.9), Detection("PERSON", 7, 18, 0.9)]
+        filtered = self.filter.apply(results, self.text, doc_type="facture")
+        self.assertEqual([(r.start, r.end) for r in filtered], [(7, 18)])
+
+    def test_doc_type_threshold_and_exclusions(self):
+        results = [Detection("PERSON", 7, 18, 0.7), Detection("MONEY", 24, 32, 0.9), Detection("PERSON", 7, 18, 0.8)]
+        filtered = self.filter.apply(results, self.text, doc_type="facture")
+        self.assertEqual([(r.entity_type, r.score) for r in filtered], [("PERSON", 0.8)])
+
+    def test_entities_to_ignore(self):
+        results = [Detection("DATE_TIME", 0, 6, 0.9)]
+        self.assertEqual(self.filter.apply(results, self.text, entities_to_ignore=["DATE_TIME"]), [])
+
+    def test_filters_from_config(self):
+        path = "test_filters.yaml"
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("global: ['Dupont']\nfilters:\n  default:\n    min_score: 0.6\n  facture:\n    min_score: 0.95\n")
+        try:
+            self.filter.load_allow_lists(path)
+        finally:
+            os.remove(path)
+
+        self.assertEqual(self.filter.doc_type_filters["facture"], {"min_score": 0.95, "exclude": ["MONEY"]})
+        self.assertEqual(self.filter.default_min_score, 0.6)
+        self.assertEqual(self.filter.apply([Detection("PERSON", 12, 18, 0.9)], self.text), [])
+
+    def test_class_defaults_are_not_mutated(self):
+        self.filter.doc_type_filters["facture"]["exclude"].append("PERSON")
+        self.assertEqual(DetectionFilter.DOC_TYPE_FILTERS["facture"]["exclude"], ["MONEY"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+import numpy as np
+from PIL import Image, ImageDraw
+from anonymizer.image_processing import ocr_quality, estimate_orientation, rotate_image, map_boxes_to_original
+
+def make_text_page(size=(620, 877)):
+    """A white page with rows of black bars standing for lines of words."""
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    for row in range(15):
+        for word in range(5):
+            x, y = 50 + word * 105, 60 + row * 50
+            draw.rectangle([x, y, x + 80, y + 12], fill="black")
+    return image
+
+class TestOrientation(unittest.TestCase):
+    def test_ocr_quality_ignores_non_words(self):
+        ocr_result = {"text": ["", "Jean", "Dupont", " "], "conf": [-1, 90, "70", 95]}
+        self.assertEqual(ocr_quality(ocr_result), (2, 80.0))
+        self.assertEqual(ocr_quality({"text": [], "conf": []}), (0, 0.0))
+
+    def test_skew_is_estimated(self):
+        page = make_text_page()
+        self.assertEqual(estimate_orientation(page), 0.0)
+        self.assertEqual(estimate_orientation(rotate_image(page, 6)), -6.0)
+        self.assertEqual(estimate_orientation(rotate_image(page, -4.5)), 4.5)
+
+    def test_quarter_turn_is_detected(self):
+        # Without OSD data, the direction of the quarter turn is not known
+        self.assertEqual(abs(estimate_orientation(rotate_image(make_text_page(), 90))), 90.0)
+
+    def test_blank_and_dark_pages_are_left_alone(self):
+        self.assertEqual(estimate_orientation(Image.new("L", (300, 300), 255)), 0.0)
+        self.assertEqual(estimate_orientation(Image.new("L", (300, 300), 0)), 0.0)
+
+    def test_boxes_are_mapped_back_to_the_original(self):
+        image = Image.new("L", (400, 300), 255)
+        ImageDraw.Draw(image).rectangle([50, 60, 120, 90], fill=0)
+        for angle in (90, -90, 17):
+            rotated = rotate_image(image, angle)
+            ys, xs = np.nonzero(np.array(rotated) < 128)
+            ocr_result = {"text": ["Dupont"], "left": [int(xs.min())], "top": [int(ys.min())],
+                          "width": [int(xs.max() - xs.min())], "height": [int(ys.max() - ys.min())]}
+
+            mapped = map_boxes_to_original(ocr_result, angle, rotated.size, image.size)
+
+            left, top = mapped["left"][0], mapped["top"][0]
+            right, bottom = left + mapped["width"][0], top + mapped["height"][0]
+            # The mapped box covers the word, and is tight for quarter turns
+            self.assertTrue(left <= 51 and top <= 61 and right >= 119 and bottom >= 89, (angle, mapped))
+            if angle % 90 == 0:
+                self.assertTrue(left >= 48 and top >= 58 and right <= 123 and bottom <= 93, (angle, mapped))
+            self.assertEqual(mapped["text"], ["Dupont"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import unittest
+import os
+import shutil
+import time
+import fitz
+from anonymizer.job_queue import JobQueue, QueueRunner, estimate_cost
+
+class FakeProcessor:
+    """Stands in for the pipeline in worker processes: behaviour depends on the file name."""
+
+    def process_file(self, path):
+        name = os.path.basename(path)
+        if name.startswith("slow"):
+            time.sleep(60)
+        if name.startswith("crash"):
+            os._exit(3)
+        if name.startswith("error"):
+            raise ValueError("unreadable file")
+        return path + ".out"
+
+class FailingFactory:
+    def __call__(self):
+        raise RuntimeError("model not found")
+
+def write_pdf(path, pages, text=True):
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        if text:
+            page.insert_text((72, 72), "Facture numéro 42")
+    doc.save(path)
+    doc.close()
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = "test_job_queue_output"
+        os.makedirs(self.test_dir, exist_ok=True)
+        self.queue = JobQueue(os.path.join(self.test_dir, "queue.db"), max_attempts=2, retry_delay=0)
+
+    def tearDown(self):
+        self.queue.close()
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+
+    def make_file(self, name):
+        path = os.path.join(self.test_dir, name)
+        with open(path, 'wb') as f:
+            f.write(b"data")
+        return path
+
+    def test_estimate_cost_ranks_scanned_and_long_documents_first(self):
+        short_path = os.path.join(self.test_dir, "short.pdf")
+        long_path = os.path.join(self.test_dir, "long.pdf")
+        scanned_path = os.path.join(self.test_dir, "scanned.pdf")
+        write_pdf(short_path, 1)
+        write_pdf(long_path, 5)
+        write_pdf(scanned_path, 1, text=False)
+
+        self.assertLess(estimate_cost(short_path), estimate_cost(long_path))
+        self.assertLess(estimate_cost(short_path), estimate_cost(scanned_path))
+
+    def test_claim_order_priority_then_longest_first(self):
+        self.queue.enqueue(self.make_file("small.pdf"), cost=1)
+        self.queue.enqueue(self.make_file("big.pdf"), cost=50)
+        self.queue.enqueue(self.make_file("urgent.pdf"), priority=1, cost=0)
+
+        order = [os.path.basename(self.queue.claim()[1]) for _ in range(3)]
+        self.assertEqual(order, ["urgent.pdf", "big.pdf", "small.pdf"])
+        self.assertIsNone(self.queue.claim())
+
+    def test_retry_backoff_and_dead_letter(self):
+        queue = JobQueue(os.path.join(self.test_dir, "backoff.db"), max_attempts=2, retry_delay=60)
+        try:
+            queue.enqueue(self.make_file("a.pdf"), cost=1)
+            job_id, _, attempts = queue.claim()
+            self.assertEqual(attempts, 1)
+            self.assertEqual(queue.fail(job_id, "boom"), "pending")
+            # Waiting for the retry delay
+            self.assertIsNone(queue.claim())
+            self.assertTrue(queue.has_unfinished())
+
+            queue.connection.execute("UPDATE jobs SET next_attempt_at = 0")
+            job_id, _, attempts = queue.claim()
+            self.assertEqual(attempts, 2)
+            self.assertEqual(queue.fail(job_id, "boom again"), "dead")
+            self.assertFalse(queue.has_unfinished())
+            dead = queue.dead_letters()
+            self.assertEqual(len(dead), 1)
+            self.assertEqual(dead[0][1:], (2, "boom again"))
+        finally:
+            queue.close()
+
+    def test_enqueue_again_keeps_attempts_and_dead_letters(self):
+        path = self.make_file("a.pdf")
+        self.queue.enqueue(path, cost=1)
+        job_id, _, _ = self.queue.claim()
+        self.queue.fail(job_id, "boom")
+        self.queue.enqueue(path, cost=1)
+        # The interrupted retry resumes with its attempt count
+        self.assertEqual(self.queue.claim()[2], 2)
+        self.assertEqual(self.queue.fail(job_id, "boom again"), "dead")
+
+        # A new run does not bring the dead letter back
+        self.queue.enqueue(path, cost=1)
+        self.assertEqual(self.queue.counts(), {"dead": 1})
+
+        # It starts over once the file changes, or when forced
+        with open(path, 'wb') as f:
+            f.write(b"new content")
+        self.queue.enqueue(path, cost=1)
+        self.assertEqual(self.queue.counts(), {"pending": 1})
+        self.assertEqual(self.queue.claim()[2], 1)
+        self.queue.fail(job_id, "boom")
+        self.queue.enqueue(path, cost=1, reset=True)
+        self.assertEqual(self.queue.claim()[2], 1)
+
+    def test_running_jobs_are_requeued_after_restart(self):
+        self.queue.enqueue(self.make_file("a.pdf"), cost=1)
+        self.queue.claim()
+        self.queue.close()
+
+        self.queue = JobQueue(os.path.join(self.test_dir, "queue.db"), max_attempts=2, retry_delay=0)
+        self.assertEqual(self.queue.requeue_stale(), 1)
+        self.assertIsNotNone(self.queue.claim())
+
+    def test_runner_isolates_timeouts_crashes_and_errors(self):
+        for name in ["ok1.pdf", "ok2.pdf", "slow.pdf", "crash.pdf", "error.pdf"]:
+            self.queue.enqueue(self.make_file(name), cost=1)
+
+        done = []
+        runner = QueueRunner(self.queue, FakeProcessor, workers=2, timeout=1.0, on_done=lambda path, output: done.append(output))
+        counts = runner.run()
+
+        self.assertEqual(counts, {"done": 2, "dead": 3})
+        self.assertEqual(sorted(os.path.basename(path) for path in done), ["ok1.pdf.out", "ok2.pdf.out"])
+        errors = {os.path.basename(path): error for path, _, error in self.queue.dead_letters()}
+        self.assertIn("Timed out", errors["slow.pdf"])
+        self.assertIn("exit code 3", errors["crash.pdf"])
+        self.assertIn("unreadable file", errors["error.pdf"])
+
+    def test_runner_stops_when_workers_cannot_start(self):
+        self.queue.enqueue(self.make_file("a.pdf"), cost=1)
+        with self.assertRaises(RuntimeError):
+            QueueRunner(self.queue, FailingFactory(), timeout=5.0).run()
+
+if __name__ == '__main__':
+    unittest.main()
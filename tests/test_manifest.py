@@ -0,0 +1,74 @@
+import unittest
+import os
+import shutil
+from anonymizer.manifest import ProcessedManifest, config_fingerprint
+
+class TestProcessedManifest(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = "test_manifest_output"
+        os.makedirs(self.test_dir, exist_ok=True)
+        self.db_path = os.path.join(self.test_dir, "manifest.db")
+        self.file_path = os.path.join(self.test_dir, "facture.pdf")
+        self.output_path = os.path.join(self.test_dir, "facture_out.pdf")
+        with open(self.file_path, 'wb') as f:
+            f.write(b"%PDF-1.4 test")
+        with open(self.output_path, 'wb') as f:
+            f.write(b"%PDF-1.4 out")
+        self.manifest = ProcessedManifest(self.db_path, "fingerprint-a")
+
+    def tearDown(self):
+        self.manifest.close()
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+
+    def test_processed_file_is_skipped(self):
+        self.assertFalse(self.manifest.is_processed(self.file_path))
+        self.manifest.mark_processed(self.file_path, self.output_path)
+        self.assertTrue(self.manifest.is_processed(self.file_path))
+        self.assertEqual(self.manifest.filter_pending([self.file_path]), [])
+
+    def test_resume_after_restart(self):
+        self.manifest.mark_processed(self.file_path, self.output_path)
+        self.manifest.close()
+
+        self.manifest = ProcessedManifest(self.db_path, "fingerprint-a")
+        self.assertTrue(self.manifest.is_processed(self.file_path))
+
+    def test_touched_but_unchanged_file_is_skipped(self):
+        self.manifest.mark_processed(self.file_path, self.output_path)
+        stat = os.stat(self.file_path)
+        os.utime(self.file_path, (stat.st_atime, stat.st_mtime + 10))
+        self.assertTrue(self.manifest.is_processed(self.file_path))
+
+    def test_modified_file_is_reprocessed(self):
+        self.manifest.mark_processed(self.file_path, self.output_path)
+        with open(self.file_path, 'ab') as f:
+            f.write(b" modified")
+        self.assertFalse(self.manifest.is_processed(self.file_path))
+
+    def test_missing_output_is_reprocessed(self):
+        self.manifest.mark_processed(self.file_path, self.output_path)
+        os.remove(self.output_path)
+        self.assertFalse(self.manifest.is_processed(self.file_path))
+
+    def test_configuration_change_reprocesses(self):
+        self.manifest.mark_processed(self.file_path, self.output_path)
+        self.manifest.close()
+
+        self.manifest = ProcessedManifest(self.db_path, "fingerprint-b")
+        self.assertFalse(self.manifest.is_processed(self.file_path))
+
+    def test_config_fingerprint(self):
+        config_path = os.path.join(self.test_dir, "allow_lists.yaml")
+        with open(config_path, 'w', encoding='utf-8') as f:
+            f.write("global: ['euro']\n")
+        fingerprint = config_fingerprint([config_path], entities_to_ignore=["DATE_TIME"])
+
+        self.assertEqual(fingerprint, config_fingerprint([config_path], entities_to_ignore=["DATE_TIME"]))
+        self.assertNotEqual(fingerprint, config_fingerprint([config_path], entities_to_ignore=[]))
+        with open(config_path, 'a', encoding='utf-8') as f:
+            f.write("  - 'ttc'\n")
+        self.assertNotEqual(fingerprint, config_fingerprint([config_path], entities_to_ignore=["DATE_TIME"]))
+
+if __name__ == '__main__':
+    unittest.main()
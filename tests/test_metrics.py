@@ -0,0 +1,71 @@
+import unittest
+import os
+import json
+import shutil
+import time
+from anonymizer.metrics import StageMetrics, SlowestProfiles
+
+class TestStageMetrics(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = "test_metrics_output"
+        os.makedirs(self.test_dir, exist_ok=True)
+        self.metrics = StageMetrics()
+
+    def tearDown(self):
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+
+    def test_observe_histogram(self):
+        self.metrics.observe("ocr", 0.02, "facture")
+        self.metrics.observe("ocr", 3.0, "facture")
+        snapshot = self.metrics.snapshot()
+
+        histogram = snapshot["ocr"]["facture"]
+        self.assertEqual(histogram["count"], 2)
+        self.assertAlmostEqual(histogram["sum"], 3.02)
+        self.assertEqual(histogram["buckets"]["0.025"], 1)
+        self.assertEqual(histogram["buckets"]["5.0"], 2)
+
+    def test_doc_type_context(self):
+        with self.metrics.doc_type("rib"):
+            with self.metrics.timer("ner"):
+                pass
+        with self.metrics.timer("ner"):
+            pass
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(set(snapshot["ner"]), {"rib", "unknown"})
+
+    def test_instrument(self):
+        class Engine:
+            def run(self, value):
+                return value * 2
+
+        engine = Engine()
+        self.metrics.instrument(engine, "run", "analysis")
+        self.metrics.instrument(engine, "run", "analysis")
+        self.assertEqual(engine.run(21), 42)
+        self.assertEqual(self.metrics.snapshot()["analysis"]["unknown"]["count"], 1)
+
+    def test_export(self):
+        self.metrics.observe("save", 0.5, "devis")
+        prom_path = self.metrics.export(os.path.join(self.test_dir, "metrics.prom"))
+        json_path = self.metrics.export(os.path.join(self.test_dir, "metrics.json"))
+
+        with open(prom_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        self.assertIn('anonymizer_stage_duration_seconds_count{stage="save",doc_type="devis"} 1', content)
+        self.assertIn('le="+Inf"', content)
+        with open(json_path, 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f)["save"]["devis"]["count"], 1)
+
+    def test_slowest_profiles(self):
+        profiles = SlowestProfiles(2)
+        for name, delay in [("a.pdf", 0.0), ("b.pdf", 0.1), ("c.pdf", 0.05)]:
+            with profiles.profile(name):
+                time.sleep(delay)
+        paths = profiles.dump(self.test_dir)
+        self.assertEqual(len(paths), 2)
+        self.assertTrue(paths[0].endswith("01_b.prof"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+import yaml
+from presidio_analyzer import PatternRecognizer, Pattern
+from presidio_analyzer.predefined_recognizers import CreditCardRecognizer, IbanRecognizer
+from anonymizer.recognizers import FrenchLicensePlateRecognizer, FrenchInsuranceRecognizer
+from types import SimpleNamespace
+from anonymizer.analyzer import FrenchAnalyzer
+from anonymizer.pattern_scanner import PatternScanner, TextFeatures, regex_requirements
+
+SAMPLES = [
+    "Facture FA2024 du 12/03/2024, client 123456, SIRET 123 456 789 00012",
+    "N° Facture 20240042 - TVA FR 12 345 678 901 - IBAN FR76 3000 6000 0112 3456 7890 189",
+    "Contrat CONT-1234567, devis DEVIS-123456, véhicule AB-123-CD et ancienne plaque 1234 AB 75",
+    "Assurance AA 12345678, sécurité sociale 1 85 05 78 006 084 36, BIC BNPAFRPPXXX",
+    "Carte 4111 1111 1111 1111 et 4111 1111 1111 1112 (invalide)",
+    "Aucun identifiant dans ce courrier.",
+    "",
+]
+
+def load_custom_recognizers():
+    with open("custom_recognizers.yaml", 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    return [
+        PatternRecognizer(
+            supported_entity=rec['entity'],
+            patterns=[Pattern(name=p['name'], regex=p['regex'], score=p.get('score', 0.5)) for p in rec['patterns']],
+            supported_language="fr",
+            name=rec['entity']
+        )
+        for rec in config['recognizers']
+    ]
+
+def spans(results):
+    return sorted((r.entity_type, r.start, r.end, r.score) for r in results)
+
+class TestPatternScanner(unittest.TestCase):
+    def test_results_match_stock_recognizers(self):
+        recognizers = load_custom_recognizers() + [FrenchLicensePlateRecognizer(), FrenchInsuranceRecognizer(), CreditCardRecognizer(supported_language="fr")]
+        expected = {rec.name: [spans(rec.analyze(text, None)) for text in SAMPLES] for rec in recognizers}
+
+        scanner = PatternScanner.install(recognizers)
+        self.assertEqual(len(scanner.recognizers), len(recognizers))
+        for rec in recognizers:
+            self.assertEqual([spans(rec.analyze(text, None)) for text in SAMPLES], expected[rec.name], rec.name)
+
+    def test_recognizers_with_their_own_analyze_are_left_alone(self):
+        iban = IbanRecognizer(supported_language="fr")
+        scanner = PatternScanner.install([iban, FrenchInsuranceRecognizer()])
+        self.assertEqual(len(scanner.recognizers), 1)
+        self.assertEqual(iban.analyze.__func__, IbanRecognizer.analyze)
+
+    def test_prefilter_skips_patterns_that_cannot_match(self):
+        features = TextFeatures("Devis pour le client, montant 1 250 euros")
+        self.assertTrue(features.satisfies(regex_requirements(r"(?:Devis|Estimation)[:\s#]*([A-Z]?\d{4})"), True))
+        self.assertFalse(features.satisfies(regex_requirements(r"CN-\d{6}|CONT-\d{6,8}"), True))
+        # 14 digits are needed for a SIRET, the text has at most 4 in a row
+        self.assertFalse(features.satisfies(regex_requirements(r"\b\d{3}\s?\d{3}\s?\d{3}\s?\d{5}\b|\b\d{14}\b"), True))
+        self.assertEqual(features.max_digit_run, 5)
+
+    def test_requirements(self):
+        self.assertEqual(regex_requirements(r"\bFR\d{2}\s?\d{4}\b"), [(("fr",), 6)])
+        self.assertEqual(regex_requirements(r"SIREN[:\s]+\d{9}|\b\d{9}\b"), [(("siren",), 9), ((), 9)])
+        # Unsupported constructs only weaken the requirements
+        self.assertEqual(regex_requirements(r"(?:ab)*\d+"), [((), 1)])
+
+    def test_identical_regexes_are_evaluated_once(self):
+        first = PatternRecognizer(supported_entity="A", patterns=[Pattern("a", r"\b\d{9}\b", 0.6)], supported_language="fr")
+        second = PatternRecognizer(supported_entity="B", patterns=[Pattern("b", r"\b\d{9}\b", 0.8)], supported_language="fr")
+        scanner = PatternScanner.install([first, second])
+        self.assertEqual(len(scanner.patterns), 1)
+
+        text = "numéro 123456789"
+        self.assertEqual(spans(first.analyze(text, None)), [("A", 7, 16, 0.6)])
+        self.assertEqual(spans(second.analyze(text, None)), [("B", 7, 16, 0.8)])
+
+    def test_same_text_analyzed_twice_gets_fresh_results(self):
+        recognizer = FrenchInsuranceRecognizer()
+        PatternScanner.install([recognizer])
+        first = recognizer.analyze("Police AA 12345678", None)
+        first[0].score = 0.1
+        second = recognizer.analyze("Police AA 12345678", None)
+        self.assertEqual(second[0].score, 0.8)
+
+    def test_scanned_recognizers_are_timed_as_one_stage(self):
+        iban = IbanRecognizer(supported_language="fr")
+        insurance = FrenchInsuranceRecognizer()
+        analyzer = SimpleNamespace(pattern_scanner=PatternScanner.install([iban, insurance]))
+        nlp_engine = SimpleNamespace(process_text=lambda text, language: None)
+        FrenchAnalyzer._instrument(analyzer, nlp_engine, SimpleNamespace(recognizers=[iban, insurance]))
+
+        # The first scanned recognizer called on a text would absorb the whole shared scan
+        self.assertIsNone(getattr(insurance.analyze, "_timed_stage", None))
+        self.assertEqual(iban.analyze._timed_stage, f"recognizer.{iban.name}")
+        self.assertEqual(nlp_engine.process_text._timed_stage, "ner")
+
+if __name__ == '__main__':
+    unittest.main()
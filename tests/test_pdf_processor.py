@@ -0,0 +1,277 @@
+import unittest
+import os
+import sys
+import shutil
+import subprocess
+import numpy as np
+from unittest.mock import MagicMock
+import fitz
+from anonymizer.pdf_processor import PDFProcessor, rasterize_page, pixmap_to_image, redact_pixmap
+from anonymizer.filters import DetectionFilter
+from anonymizer.detections import Detection
+from presidio_analyzer import RecognizerResult
+
+def make_pdf_bytes(text):
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), text)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+class TestPDFProcessor(unittest.TestCase):
+    def setUp(self):
+        self.analyzer = MagicMock()
+        self.analyzer.detection_filter = DetectionFilter([], {})
+        self.image_redactor = MagicMock()
+        self.processor = PDFProcessor(self.analyzer, self.image_redactor)
+
+    def test_process_bytes(self):
+        text = "Client Jean Dupont"
+        self.analyzer.analyze_raw.return_value = [
+            RecognizerResult(entity_type="PERSON", start=7, end=18, score=0.9)
+        ]
+
+        redacted_bytes, results = self.processor.process_bytes(memoryview(make_pdf_bytes(text)))
+
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].entity_type, "PERSON")
+        doc = fitz.open(stream=redacted_bytes, filetype="pdf")
+        page_text = doc[0].get_text()
+        doc.close()
+        self.assertIn("Client", page_text)
+        self.assertNotIn("Dupont", page_text)
+
+    def test_process_bytes_ignored_entities(self):
+        self.analyzer.analyze_raw.return_value = [
+            RecognizerResult(entity_type="DATE_TIME", start=0, end=6, score=0.9)
+        ]
+
+        redacted_bytes, results = self.processor.process_bytes(make_pdf_bytes("Lundi matin"), entities_to_ignore=["DATE_TIME"])
+
+        self.assertEqual(results, [])
+        doc = fitz.open(stream=redacted_bytes, filetype="pdf")
+        self.assertIn("Lundi", doc[0].get_text())
+        doc.close()
+
+    def test_process_bytes_records_raw_pages(self):
+        self.analyzer.analyze_raw.return_value = [
+            RecognizerResult(entity_type="PERSON", start=7, end=18, score=0.3)
+        ]
+        raw_pages = []
+
+        _, results = self.processor.process_bytes(make_pdf_bytes("Client Jean Dupont"), doc_type="facture", raw_pages=raw_pages)
+
+        # Filtered out by the facture threshold, but kept in the raw detections with its geometry
+        self.assertEqual(results, [])
+        self.assertEqual(raw_pages[0]["kind"], "native")
+        self.assertEqual(raw_pages[0]["detections"][0]["entity_type"], "PERSON")
+        self.assertEqual(len(raw_pages[0]["detections"][0]["boxes"]), 1)
+
+    def test_scanned_page_is_filled_on_the_pixmap(self):
+        doc = fitz.open()
+        doc.new_page(width=100, height=50)
+        data = doc.tobytes()
+        doc.close()
+        detection = Detection("PERSON", 0, 11, 0.9, [[10, 10, 40, 20], [45, 10, 80, 20]])
+        self.image_redactor.analyze_image.return_value = ("Jean Dupont", [detection])
+        self.image_redactor.filter_detections.return_value = [detection]
+
+        redacted_bytes, results = self.processor.process_bytes(data)
+
+        self.assertEqual([(r.entity_type, r.start, r.end) for r in results], [("PERSON", 0, 11)])
+        analyzed_image = self.image_redactor.analyze_image.call_args[0][0]
+        self.assertEqual(analyzed_image.size, (100 * PDFProcessor.SCAN_ZOOM, 50 * PDFProcessor.SCAN_ZOOM))
+        doc = fitz.open(stream=redacted_bytes, filetype="pdf")
+        pix = rasterize_page(doc[0], PDFProcessor.SCAN_ZOOM)
+        doc.close()
+        image = pixmap_to_image(pix)
+        # Both words and the space between them are covered by one line rectangle
+        self.assertEqual(image.getpixel((42, 15)), (0, 0, 0))
+        self.assertEqual(image.getpixel((90, 15)), (255, 255, 255))
+
+    def test_scanned_page_analysis_failure_writes_no_output(self):
+        doc = fitz.open()
+        doc.new_page(width=100, height=50)
+        data = doc.tobytes()
+        doc.close()
+        output_path = "test_pdf_ocr_failure_out.pdf"
+        with open("test_pdf_ocr_failure.pdf", 'wb') as f:
+            f.write(data)
+        self.image_redactor.analyze_image.side_effect = RuntimeError("tesseract is not installed")
+        try:
+            with self.assertRaises(RuntimeError):
+                self.processor.process("test_pdf_ocr_failure.pdf", output_path)
+            with self.assertRaises(RuntimeError):
+                self.processor.process_bytes(data)
+            self.assertFalse(os.path.exists(output_path))
+        finally:
+            os.remove("test_pdf_ocr_failure.pdf")
+
+    def test_redact_pixmap_fills_in_place(self):
+        doc = fitz.open()
+        pix = rasterize_page(doc.new_page(width=50, height=50), 1)
+        doc.close()
+        samples = pix.samples_mv
+
+        redact_pixmap(pix, [Detection("PERSON", 0, 4, 0.9, [[5, 5, 9, 9]])])
+
+        self.assertIs(pix.samples_mv.obj, samples.obj)
+        self.assertEqual(pix.pixel(5, 5), (0, 0, 0))
+        self.assertEqual(pix.pixel(9, 9), (0, 0, 0))
+        self.assertEqual(pix.pixel(11, 11), (255, 255, 255))
+
+# Runs in a fresh process: prints the peak RSS growth (MB) while redacting a scanned PDF.
+# VmHWM is used rather than ru_maxrss, which on Linux keeps the peak of the forking parent.
+# The OCR stub is a plain class: a MagicMock would keep every page image it is called with.
+MEMORY_SCRIPT = """
+import sys
+from anonymizer.pdf_processor import PDFProcessor
+from anonymizer.filters import DetectionFilter
+
+class Analyzer:
+    detection_filter = DetectionFilter([], {})
+
+class ImageRedactor:
+    def analyze_image(self, image, doc_type=None):
+        return "", []
+    def filter_detections(self, detections, text, entities_to_ignore=None, doc_type=None):
+        return []
+
+def status_mb(field):
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith(field)) / 1024
+
+# Resets the peak RSS (VmHWM) to the current RSS, so that import peaks are left out
+with open("/proc/self/clear_refs", "w") as f:
+    f.write("5")
+start = status_mb("VmRSS:")
+PDFProcessor(Analyzer(), ImageRedactor(), page_window=int(sys.argv[2])).process(sys.argv[1], sys.argv[1] + ".out.pdf")
+print(status_mb("VmHWM:") - start)
+"""
+
+def make_scanned_pdf(path, page_count):
+    """Scanned-like pages: a distinct full-page grayscale image on each page."""
+    gradient = np.add.outer(np.arange(842), np.arange(595))
+    doc = fitz.open()
+    for page_num in range(page_count):
+        page = doc.new_page()
+        pixels = ((gradient + page_num * 7) % 256).astype(np.uint8)
+        page.insert_image(page.rect, pixmap=fitz.Pixmap(fitz.csGRAY, 595, 842, pixels.tobytes(), False))
+    doc.save(path, deflate=True)
+    doc.close()
+
+def page_links(doc):
+    """(source page, target page) of every internal link of the document."""
+    return [(page.number, link["page"]) for page in doc for link in page.get_links() if link["kind"] == fitz.LINK_GOTO]
+
+class TestWindowedPDFProcessor(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = "test_pdf_window_output"
+        os.makedirs(self.test_dir, exist_ok=True)
+        self.input_path = os.path.join(self.test_dir, "archive.pdf")
+        doc = fitz.open()
+        for i in range(7):
+            page = doc.new_page()
+            page.insert_text((72, 72), f"Page {i} client Jean Dupont")
+        doc.set_metadata({"title": "Archive"})
+        doc.set_toc([[1, "Chap A", 1], [1, "Chap B", 5]])
+        # Links to another window, within the window, and over redacted text
+        doc[0].insert_link({"kind": fitz.LINK_GOTO, "from": fitz.Rect(72, 100, 200, 120), "page": 5, "to": fitz.Point(72, 72)})
+        doc[1].insert_link({"kind": fitz.LINK_GOTO, "from": fitz.Rect(72, 100, 200, 120), "page": 2, "to": fitz.Point(72, 72)})
+        doc[4].insert_link({"kind": fitz.LINK_GOTO, "from": fitz.Rect(60, 55, 400, 80), "page": 0, "to": fitz.Point(72, 72)})
+        doc.save(self.input_path)
+        doc.close()
+
+        self.analyzer = MagicMock()
+        self.analyzer.detection_filter = DetectionFilter([], {})
+        # "Jean Dupont" in "Page N client Jean Dupont"
+        self.analyzer.analyze_raw.return_value = [RecognizerResult(entity_type="PERSON", start=14, end=25, score=0.9)]
+
+    def tearDown(self):
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+
+    def test_windowed_output_matches_single_pass(self):
+        single_path = os.path.join(self.test_dir, "single.pdf")
+        windowed_path = os.path.join(self.test_dir, "windowed.pdf")
+        single_results = PDFProcessor(self.analyzer, MagicMock()).process(self.input_path, single_path)
+        raw_pages = []
+        windowed_results = PDFProcessor(self.analyzer, MagicMock(), page_window=3).process(self.input_path, windowed_path, raw_pages=raw_pages)
+
+        self.assertEqual([(r.entity_type, r.start, r.end) for r in windowed_results], [(r.entity_type, r.start, r.end) for r in single_results])
+        self.assertEqual(len(windowed_results), 7)
+        self.assertFalse(hasattr(windowed_results[0], "boxes"))
+        self.assertEqual([page["page"] for page in raw_pages], list(range(7)))
+        self.assertFalse(os.path.exists(windowed_path + ".part"))
+
+        doc = fitz.open(windowed_path)
+        try:
+            self.assertEqual(len(doc), 7)
+            self.assertEqual(doc.metadata["title"], "Archive")
+            for i, page in enumerate(doc):
+                text = page.get_text()
+                self.assertIn(f"Page {i} client", text)
+                self.assertNotIn("Dupont", text)
+            with fitz.open(single_path) as single:
+                self.assertEqual(doc.get_toc(), [[1, "Chap A", 1], [1, "Chap B", 5]])
+                self.assertEqual(doc.get_toc(), single.get_toc())
+                self.assertEqual(page_links(doc), page_links(single))
+            self.assertEqual(page_links(doc), [(0, 5), (1, 2)])
+            self.assertFalse(any(link["kind"] == fitz.LINK_URI for page in doc for link in page.get_links()))
+        finally:
+            doc.close()
+
+    def test_analyze_only_writes_nothing(self):
+        before = sorted(os.listdir(self.test_dir))
+        image_redactor = MagicMock()
+
+        page_count, results = PDFProcessor(self.analyzer, image_redactor).analyze(self.input_path, entities_to_ignore=["DATE_TIME"])
+
+        self.assertEqual(page_count, 7)
+        self.assertEqual([(r.entity_type, r.start, r.end) for r in results], [("PERSON", 14, 25)] * 7)
+        self.assertEqual(sorted(os.listdir(self.test_dir)), before)
+        image_redactor.analyze_image.assert_not_called()
+
+    def test_analyze_only_runs_ocr_on_scans(self):
+        doc = fitz.open()
+        doc.new_page(width=100, height=50)
+        scan_path = os.path.join(self.test_dir, "scan.pdf")
+        doc.save(scan_path)
+        doc.close()
+        image_redactor = MagicMock()
+        detection = Detection("PERSON", 0, 11, 0.9, [[10, 10, 40, 20]])
+        image_redactor.analyze_image.return_value = ("Jean Dupont", [detection])
+        image_redactor.filter_detections.return_value = [detection]
+
+        page_count, results = PDFProcessor(self.analyzer, image_redactor).analyze(scan_path)
+
+        self.assertEqual(page_count, 1)
+        self.assertEqual([(r.entity_type, r.start, r.end) for r in results], [("PERSON", 0, 11)])
+        image_redactor.analyze_image.assert_called_once()
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "reads the peak RSS from /proc")
+    def test_windowed_memory_does_not_grow_with_page_count(self):
+        growth = {}
+        for page_count in (8, 48):
+            path = os.path.join(self.test_dir, f"scan_{page_count}.pdf")
+            make_scanned_pdf(path, page_count)
+            output = subprocess.run([sys.executable, "-c", MEMORY_SCRIPT, path, "4"], capture_output=True, text=True, check=True,
+                                    cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            growth[page_count] = float(output.stdout.strip().splitlines()[-1])
+
+        # Six times the pages, about the same peak: only one window is held at a time
+        self.assertLess(growth[48] - growth[8], 10, growth)
+
+    def test_window_size_from_memory_limit(self):
+        doc = fitz.open(self.input_path)
+        try:
+            self.assertIsNone(PDFProcessor(self.analyzer, MagicMock()).window_size(doc))
+            self.assertIsNone(PDFProcessor(self.analyzer, MagicMock(), page_window=10).window_size(doc))
+            # An A4 page at zoom 2 takes about 8 MB
+            self.assertEqual(PDFProcessor(self.analyzer, MagicMock(), max_memory_mb=20).window_size(doc), 2)
+        finally:
+            doc.close()
+
+if __name__ == '__main__':
+    unittest.main()
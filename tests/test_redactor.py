@@ -0,0 +1,125 @@
+import unittest
+import os
+from unittest.mock import MagicMock
+from PIL import Image
+from anonymizer.redactor import FrenchImageRedactor
+from anonymizer.filters import DetectionFilter
+from anonymizer.pipeline import summarize_detections
+from anonymizer.image_processing import rotate_image
+from presidio_analyzer import RecognizerResult
+from tests.test_image_processing import make_text_page
+
+OCR_RESULT = {
+    "text": ["Jean", "Dupont", "paye", "euro"],
+    "left": [0, 20, 50, 80],
+    "top": [0, 0, 0, 0],
+    "width": [15, 25, 20, 15],
+    "height": [10, 10, 10, 10],
+    "conf": [90, 90, 90, 90]
+}
+
+class TestFrenchImageRedactor(unittest.TestCase):
+    def setUp(self):
+        self.analyzer = MagicMock()
+        self.analyzer.detection_filter = DetectionFilter(["euro"], {})
+        self.analyzer.analyze_raw.return_value = [
+            RecognizerResult(entity_type="PERSON", start=0, end=11, score=0.9),
+            RecognizerResult(entity_type="PERSON", start=17, end=21, score=0.9)
+        ]
+        self.redactor = FrenchImageRedactor(self.analyzer)
+        self.redactor.analyzer_engine.ocr.perform_ocr = MagicMock(return_value=OCR_RESULT)
+
+    def test_redact_image_only_fills_filtered_boxes(self):
+        image = Image.new("RGB", (100, 20), "white")
+        raw_pages = []
+
+        redacted_image, results = self.redactor.redact_image(image, raw_pages=raw_pages)
+
+        self.assertEqual([(r.start, r.end) for r in results], [(0, 11)])
+        self.assertEqual(redacted_image.getpixel((5, 5)), (0, 0, 0))
+        self.assertEqual(redacted_image.getpixel((30, 5)), (0, 0, 0))
+        # "paye" is not an entity and "euro" is allow-listed
+        self.assertEqual(redacted_image.getpixel((60, 5)), (255, 255, 255))
+        self.assertEqual(redacted_image.getpixel((85, 5)), (255, 255, 255))
+        self.assertEqual(image.getpixel((5, 5)), (255, 255, 255))
+
+        self.assertEqual(raw_pages[0]["text"], "Jean Dupont paye euro")
+        self.assertEqual(len(raw_pages[0]["detections"]), 2)
+        self.assertEqual(raw_pages[0]["detections"][0]["boxes"], [[0, 0, 15, 10], [20, 0, 45, 10]])
+
+    def test_analyze_returns_filtered_results_without_rendering(self):
+        image_path = "test_redactor_triage.png"
+        Image.new("RGB", (100, 20), "white").save(image_path)
+        try:
+            results = self.redactor.analyze(image_path)
+        finally:
+            os.remove(image_path)
+
+        self.assertEqual([(r.start, r.end) for r in results], [(0, 11)])
+        summary = summarize_detections("scan.png", "facture", 1, results)
+        self.assertEqual(summary["detections"], 1)
+        self.assertEqual(summary["entities"], {"PERSON": 1})
+        self.assertEqual(summary["max_score"], 0.9)
+        self.assertIsNone(summarize_detections("vide.png", None, 1, [])["max_score"])
+
+    def test_ocr_failure_writes_no_output(self):
+        image_path = "test_redactor_ocr_failure.png"
+        output_path = "test_redactor_ocr_failure_out.png"
+        Image.new("RGB", (100, 20), "white").save(image_path)
+        self.redactor.analyzer_engine.ocr.perform_ocr = MagicMock(side_effect=RuntimeError("tesseract is not installed"))
+        try:
+            with self.assertRaises(RuntimeError):
+                self.redactor.redact(image_path, output_path)
+            with self.assertRaises(RuntimeError):
+                with open(image_path, 'rb') as f:
+                    self.redactor.redact_bytes(f.read(), "PNG")
+            self.assertFalse(os.path.exists(output_path))
+        finally:
+            for path in (image_path, output_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+class TestOCRConfidenceGate(unittest.TestCase):
+    def setUp(self):
+        self.analyzer = MagicMock()
+        self.analyzer.detection_filter = DetectionFilter([], {})
+        self.redactor = FrenchImageRedactor(self.analyzer)
+        self.ocr = MagicMock()
+        self.redactor.analyzer_engine.ocr = self.ocr
+        self.poor = {"text": ["~", "|"], "left": [0, 5], "top": [0, 0], "width": [3, 3], "height": [3, 3], "conf": [12, 20]}
+
+    def test_confident_pass_is_not_retried(self):
+        good = {"text": ["a", "b", "c", "d", "e"], "left": [0] * 5, "top": [0] * 5, "width": [1] * 5, "height": [1] * 5, "conf": [90] * 5}
+        self.ocr.perform_ocr.return_value = good
+
+        self.assertIs(self.redactor.perform_ocr(make_text_page()), good)
+        self.ocr.perform_ocr.assert_called_once()
+
+    def test_skewed_scan_is_retried_and_boxes_mapped_back(self):
+        page = rotate_image(make_text_page(), 6)
+        retry = {"text": ["Jean", "Dupont", "client", "facture", "Paris"], "left": [100] * 5, "top": [200] * 5,
+                 "width": [80] * 5, "height": [12] * 5, "conf": [85] * 5}
+        self.ocr.perform_ocr.side_effect = [self.poor, retry]
+
+        result = self.redactor.perform_ocr(page)
+
+        rotated_image = self.ocr.perform_ocr.call_args_list[1][0][0]
+        self.assertNotEqual(rotated_image.size, page.size)
+        self.assertEqual(result["text"], retry["text"])
+        # A 6 degree turn makes the box a little taller, and it moves
+        self.assertGreater(result["height"][0], 12)
+        self.assertNotEqual((result["left"][0], result["top"][0]), (100, 200))
+
+    def test_worse_retry_keeps_the_first_pass(self):
+        self.ocr.perform_ocr.side_effect = [self.poor, {"text": [], "left": [], "top": [], "width": [], "height": [], "conf": []}]
+
+        self.assertIs(self.redactor.perform_ocr(rotate_image(make_text_page(), 6)), self.poor)
+
+    def test_upright_page_with_poor_text_gets_no_second_pass(self):
+        self.ocr.perform_ocr.return_value = self.poor
+
+        self.assertIs(self.redactor.perform_ocr(make_text_page()), self.poor)
+        self.ocr.perform_ocr.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+from unittest.mock import MagicMock
+import os
+import json
+import shutil
+import fitz
+from anonymizer.pdf_processor import PDFProcessor
+from anonymizer.filters import DetectionFilter
+from anonymizer.refilter import RawDetectionStore, Refilterer
+from anonymizer.utils import AuditLogger
+from presidio_analyzer import RecognizerResult
+
+class TestRefilter(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = "test_refilter_output"
+        self.raw_dir = os.path.join(self.test_dir, "raw")
+        self.out_dir = os.path.join(self.test_dir, "out")
+        os.makedirs(self.out_dir)
+        self.source_path = os.path.join(self.test_dir, "facture.pdf")
+
+        doc = fitz.open()
+        doc.new_page().insert_text((72, 72), "Client Jean Dupont")
+        doc.save(self.source_path)
+        doc.close()
+
+        analyzer = MagicMock()
+        analyzer.detection_filter = DetectionFilter([], {})
+        analyzer.analyze_raw.return_value = [
+            RecognizerResult(entity_type="PERSON", start=7, end=18, score=0.6)
+        ]
+        self.processor = PDFProcessor(analyzer, MagicMock())
+        self.store = RawDetectionStore(self.raw_dir)
+
+    def tearDown(self):
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+
+    def _page_text(self, path):
+        with fitz.open(path) as doc:
+            return doc[0].get_text()
+
+    def test_refilter_with_new_threshold(self):
+        raw_pages = []
+        first_output = os.path.join(self.test_dir, "first.pdf")
+        results = self.processor.process(self.source_path, first_output, doc_type="facture", raw_pages=raw_pages)
+        self.store.save(self.source_path, "facture", raw_pages)
+
+        # Score 0.6 is below the facture threshold: nothing redacted on the first run
+        self.assertEqual(results, [])
+        self.assertIn("Dupont", self._page_text(first_output))
+
+        detection_filter = DetectionFilter([], {})
+        detection_filter.doc_type_filters["facture"]["min_score"] = 0.5
+        refilterer = Refilterer(detection_filter, self.out_dir, AuditLogger(self.out_dir))
+        raw_path = next(self.store.iter_records())
+        output_path = refilterer.refilter(self.store.load(raw_path))
+
+        self.assertNotIn("Dupont", self._page_text(output_path))
+        self.assertIn("Client", self._page_text(output_path))
+        with open(os.path.join(self.out_dir, "facture_audit.json"), 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f)["detections"][0]["entity_type"], "PERSON")
+
+    def test_refilter_skips_modified_source(self):
+        self.store.save(self.source_path, "facture", [])
+        with open(self.source_path, 'ab') as f:
+            f.write(b"\n%modified")
+
+        refilterer = Refilterer(DetectionFilter([], {}), self.out_dir, AuditLogger(self.out_dir))
+        raw_path = next(self.store.iter_records())
+        self.assertIsNone(refilterer.refilter(self.store.load(raw_path)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,9 @@ import unittest
 import os
 import json
 import shutil
-from anonymizer.utils import AuditLogger
+import sqlite3
+from multiprocessing import Process
+from anonymizer.utils import AuditLogger, SQLiteAuditLogger, create_audit_logger
 from presidio_analyzer import RecognizerResult
 
 class TestAuditLogger(unittest.TestCase):
@@ -29,5 +31,110 @@ class TestAuditLogger(unittest.TestCase):
             self.assertEqual(len(data["detections"]), 1)
             self.assertEqual(data["detections"][0]["entity_type"], "PERSON")
 
+    def test_build_audit(self):
+        results = [
+            RecognizerResult(entity_type="IBAN", start=3, end=30, score=0.95)
+        ]
+        audit_data = self.logger.build_audit("test.png", results)
+
+        self.assertEqual(audit_data["filename"], "test.png")
+        self.assertEqual(audit_data["detections"][0]["entity_type"], "IBAN")
+        self.assertEqual(os.listdir(self.test_dir), [])
+
+def _log_from_worker(db_path, worker):
+    audit_logger = SQLiteAuditLogger(db_path, batch_size=5)
+    for i in range(20):
+        audit_logger.log_process(f"worker{worker}_{i}.pdf", [RecognizerResult(entity_type="IBAN", start=0, end=27, score=0.95)])
+    audit_logger.close()
+
+class TestSQLiteAuditLogger(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = "test_output_sqlite"
+        os.makedirs(self.test_dir, exist_ok=True)
+        self.db_path = os.path.join(self.test_dir, "audit.db")
+        self.logger = SQLiteAuditLogger(self.db_path, batch_size=2)
+
+    def tearDown(self):
+        self.logger.close()
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+
+    def test_batched_inserts_and_query(self):
+        self.logger.log_process("rib.pdf", [RecognizerResult(entity_type="IBAN", start=0, end=27, score=0.95)], doc_type="rib")
+        # Still buffered: the batch is not full
+        self.assertFalse(os.path.exists(self.db_path))
+
+        self.logger.log_process("facture.pdf", [RecognizerResult(entity_type="PERSON", start=0, end=4, score=0.9)], doc_type="facture")
+        self.assertTrue(os.path.exists(self.db_path))
+
+        self.assertEqual([row[0] for row in self.logger.find_documents(entity_type="IBAN")], ["rib.pdf"])
+        self.assertEqual([row[0] for row in self.logger.find_documents(doc_type="facture")], ["facture.pdf"])
+        self.assertEqual(self.logger.find_documents(since="2999-01-01"), [])
+
+    def test_export_json(self):
+        self.logger.log_process("test.pdf", [RecognizerResult(entity_type="PERSON", start=0, end=4, score=0.9)])
+        self.logger.log_process("test.pdf", [RecognizerResult(entity_type="IBAN", start=5, end=9, score=0.95)])
+        export_dir = os.path.join(self.test_dir, "export")
+
+        self.assertEqual(self.logger.export_json(export_dir), 1)
+        with open(os.path.join(export_dir, "test_audit.json"), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        # Same format as AuditLogger, latest run wins
+        self.assertEqual(set(data), {"filename", "timestamp", "detections"})
+        self.assertEqual(data["detections"], [{"entity_type": "IBAN", "start": 5, "end": 9, "score": 0.95}])
+
+    def test_concurrent_writers(self):
+        workers = [Process(target=_log_from_worker, args=(self.db_path, worker)) for worker in range(3)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(len(self.logger.find_documents(entity_type="IBAN")), 60)
+
+    def test_locked_database_keeps_the_batch(self):
+        self.logger.log_process("init.pdf", [])
+        self.logger.flush()
+        audit_logger = SQLiteAuditLogger(self.db_path, batch_size=10, timeout=0.1)
+        audit_logger.log_process("rib.pdf", [RecognizerResult(entity_type="IBAN", start=0, end=27, score=0.95)])
+
+        # Another writer holds the lock for longer than the busy timeout
+        other = sqlite3.connect(self.db_path, isolation_level=None)
+        other.execute("BEGIN IMMEDIATE")
+        stored = []
+        audit_logger.on_stored(lambda: stored.append("rib.pdf"))
+        with self.assertRaises(sqlite3.OperationalError):
+            audit_logger.flush()
+        other.execute("ROLLBACK")
+        other.close()
+        self.assertEqual(stored, [])
+
+        audit_logger.close()
+        self.assertEqual(stored, ["rib.pdf"])
+        self.assertEqual([row[0] for row in self.logger.find_documents(entity_type="IBAN")], ["rib.pdf"])
+
+    def test_on_stored_waits_for_the_batch(self):
+        stored = []
+        self.logger.log_process("a.pdf", [])
+        self.logger.on_stored(lambda: stored.append("a.pdf"))
+        self.assertEqual(stored, [])
+
+        # The second entry fills the batch: both are committed, then reported
+        self.logger.log_process("b.pdf", [])
+        self.logger.on_stored(lambda: stored.append("b.pdf"))
+        self.assertEqual(stored, ["a.pdf", "b.pdf"])
+        self.assertEqual(len(self.logger.find_documents()), 2)
+
+        json_logger = AuditLogger(self.test_dir)
+        json_logger.log_process("c.pdf", [])
+        json_logger.on_stored(lambda: stored.append("c.pdf"))
+        self.assertEqual(stored, ["a.pdf", "b.pdf", "c.pdf"])
+
+    def test_create_audit_logger(self):
+        self.assertIsInstance(create_audit_logger("json", self.test_dir), AuditLogger)
+        self.assertIsInstance(create_audit_logger("sqlite", self.test_dir), SQLiteAuditLogger)
+        with self.assertRaises(ValueError):
+            create_audit_logger("csv", self.test_dir)
+
 if __name__ == '__main__':
     unittest.main()